@@ -0,0 +1,38 @@
+import argparse
+import importlib
+import sys
+
+# Subcommands: name -> (module, entry point, summary). Each module is
+# imported only when its subcommand runs, so `astro.py --help` stays cheap.
+commands = {
+    "planets-now": ("current_planet_position", "main", "Planets above the horizon right now"),
+    "planets-tonight": ("planet_viewer", "main", "Planets visible tonight, or the next nights a planet is visible"),
+    "dso": ("deep_object", "main", "Deep-sky objects and their best viewing times"),
+    "sun-directions": ("sun_directions", "cli", "Sunrise and sunset azimuths through the year"),
+    "next-event": ("sun_moon_events", "cli", "Next rises and sets of the Sun, Moon and planets"),
+    "map": ("visibility_map", "main", "Altitude raster and visibility mask of a body over a lat/lon grid"),
+    "conjunctions": ("conjunctions", "main", "Close approaches of the Moon, planets and deep-sky objects"),
+    "moon": ("moon_calendar", "main", "Moon phases, illumination, moonrise and moonset for each night"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="astro",
+        description="Astronomical events for a city.\n\ncommands:\n" + "\n".join(
+            f"  {name:<17} {summary}" for name, (_, _, summary) in commands.items()
+        ),
+        epilog="Run 'astro <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(commands), metavar="command", help="One of the commands above")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Options for the command")
+    args = parser.parse_args(argv)
+
+    module_name, entry_point, _ = commands[args.command]
+    module = importlib.import_module(module_name)
+    getattr(module, entry_point)(args.args, prog=f"astro {args.command}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
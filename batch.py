@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ephemeris import get_timescale, warm_up
+from locations import resolve_location, timezone_at
+from observer_context import observer_for
+from output import json_default
+
+
+def read_locations(path):
+    """Yield location records from a CSV (with a header row) or JSONL file.
+
+    Each record has either a "city" or "latitude" and "longitude"; an
+    optional "name" labels the output and "timezone" skips the lookup.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _resolve(record, offline):
+    """Return (name, ObserverContext) for an input record."""
+    if record.get("latitude") not in (None, "") and record.get("longitude") not in (None, ""):
+        lat, lon = float(record["latitude"]), float(record["longitude"])
+        tz_name = record.get("timezone") or timezone_at(lat, lon)
+        name = record.get("name") or record.get("city") or f"{lat:.4f},{lon:.4f}"
+    else:
+        location = resolve_location(record["city"], offline=offline)
+        lat, lon, tz_name = location["latitude"], location["longitude"], location["timezone"]
+        name = record.get("name") or record["city"]
+    if not tz_name:
+        raise ValueError(f"Could not determine timezone for '{name}'")
+    return name, observer_for(lat, lon, tz_name)
+
+
+def warm_up_worker(options):
+    """Worker initializer: load what the query needs before the first location arrives.
+
+    --fast queries never touch the kernel and --tables ones need only the
+    tables, so they skip loading it.
+    """
+    get_timescale()
+    if options.query == "planets-now" and options.tables:
+        from geocentric_tables import get_tables, set_tables
+        set_tables(options.tables)
+        get_tables()
+    elif options.query not in ("planets-now", "planets-tonight") or options.precision != "low":
+        warm_up()
+
+
+# Per-location computations, run inside the worker processes. A worker keeps
+# the ObserverContext of each site, so sites repeated in the input reuse it.
+
+def planets_now(observer, options):
+    from current_planet_position import get_visible_planets
+    precision = options.precision
+    if options.tables:
+        from geocentric_tables import set_tables
+        set_tables(options.tables)
+        precision = "tables"
+    visible = get_visible_planets(observer, get_timescale(), options.min_angle, precision)
+    return {"planets": [{"name": name, "altitude": alt, "azimuth": az} for name, alt, az in visible]}
+
+
+def planets_tonight(observer, options):
+    from planet_viewer import find_visible_planets
+    planets, sunset, sunrise, moon = find_visible_planets(observer, step_minutes=options.step, precision=options.precision)
+    return {
+        "sunset": sunset,
+        "sunrise": sunrise,
+        "moon_phase": moon,
+        "planets": [
+            {"name": name, "max_altitude": alt, "best_time": best, "visible_from": start, "visible_to": end}
+            for name, alt, best, start, end in sorted(planets, key=lambda x: -x[1])
+        ],
+    }
+
+
+def dso(observer, options):
+    from deep_object import find_best_times
+    return {
+        "nights": [
+            {"date": day, "condition": condition, "moon": moon,
+             "objects": [{"name": name, "best_time": best} for name, best in best_times]}
+            for day, condition, best_times, moon in find_best_times(observer, options.days)
+        ],
+    }
+
+
+def sun_directions(observer, options):
+    from sun_directions import monthly_sun_events
+    year = options.year or observer.today().year
+    sunrise_events, sunset_events = monthly_sun_events(observer, year)
+    return {
+        "events": [
+            {"event": label, "month": month, "date": event_time.date(), "azimuth": az, "altitude": alt}
+            for label, event_time, az, alt, month in sunrise_events + sunset_events
+        ],
+    }
+
+
+def next_event(observer, options):
+    from sun_moon_events import find_next_event
+    event_time, kind, body_name, alt, az = find_next_event(observer)
+    return {"event": kind, "body": body_name, "time": event_time, "azimuth": az, "altitude": alt}
+
+
+queries = {
+    "planets-now": planets_now,
+    "planets-tonight": planets_tonight,
+    "dso": dso,
+    "sun-directions": sun_directions,
+    "next-event": next_event,
+}
+
+
+def run_location(record, options):
+    """Compute one query for one location and return a JSON line (called in a worker)."""
+    try:
+        name, observer = _resolve(record, options.offline)
+        result = {"location": name, "latitude": observer.latitude, "longitude": observer.longitude,
+                  "timezone": observer.timezone.zone}
+        result.update(queries[options.query](observer, options))
+    except Exception as e:
+        result = {"location": record.get("name") or record.get("city"), "error": str(e)}
+    return json.dumps(result, default=json_default, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one query for every location in a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with 'city' or 'latitude'/'longitude' columns")
+    parser.add_argument("--query", choices=sorted(queries), default="planets-tonight", help="Query to run (default: planets-tonight)")
+    parser.add_argument("--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--min-angle", type=float, default=10, help="Minimum altitude for planets-now (default: 10)")
+    parser.add_argument("--step", type=float, default=60, help="Bracketing step in minutes for planets-tonight (default: 60)")
+    parser.add_argument("--days", type=int, default=1, help="Nights to forecast for dso (default: 1)")
+    parser.add_argument("--year", type=int, help="Year for sun-directions (default: current year)")
+    parser.add_argument("--offline", action="store_true", help="Resolve cities from the local cache only")
+    parser.add_argument("--fast", dest="precision", action="store_const", const="low", default="high",
+                        help="Use low-precision analytic planet positions (planets-now, planets-tonight)")
+    parser.add_argument("--tables", metavar="FILE",
+                        help="Interpolate planets-now positions from tables written by geocentric_tables.py")
+    args = parser.parse_args()
+
+    records = list(read_locations(args.input))
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(args.workers, initializer=warm_up_worker, initargs=(args,)) as pool:
+            chunksize = max(1, len(records) // (args.workers * 8))
+            for line in pool.map(run_location, records, [args] * len(records), chunksize=chunksize):
+                out.write(line + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    rate = len(records) / elapsed if elapsed else float("inf")
+    print(f"Processed {len(records)} locations in {elapsed:.1f}s ({rate:.1f} locations/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
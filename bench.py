@@ -0,0 +1,257 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytz
+
+import ephemeris
+import forecast_cache
+import locations
+
+# Fixture cities for the stand-in geocoder: name -> (latitude, longitude, address)
+fixture_cities = {
+    "Cincinnati": (39.1031, -84.5120, "Cincinnati, Hamilton County, Ohio, United States"),
+    "New York": (40.7128, -74.0060, "New York, United States"),
+    "London": (51.5074, -0.1278, "London, Greater London, England, United Kingdom"),
+    "Sydney": (-33.8688, 151.2093, "Sydney, New South Wales, Australia"),
+    "Singapore": (1.2903, 103.8520, "Singapore"),
+    "Cape Town": (-33.9249, 18.4241, "Cape Town, Western Cape, South Africa"),
+    "Reykjavik": (64.1466, -21.9426, "Reykjavík, Iceland"),
+    "Tromso": (69.6496, 18.9560, "Tromsø, Troms, Norway"),
+}
+
+# Fixed epoch so runs are comparable from day to day
+BENCH_DATE = date(2025, 6, 26)
+
+
+class FixtureGeocoder:
+    """geopy-style geocoder answering from fixture_cities, never the network."""
+
+    def geocode(self, query):
+        for name, (lat, lon, address) in fixture_cities.items():
+            if locations.normalize_city(name) == locations.normalize_city(query):
+                return SimpleNamespace(latitude=lat, longitude=lon, address=address)
+        return None
+
+
+def _night(city):
+    tz = pytz.timezone(city["timezone"])
+    return tz.localize(datetime.combine(BENCH_DATE, datetime.min.time()).replace(hour=21))
+
+
+def _observer(city):
+    """A fresh ObserverContext, so every call pays for its own per-site setup."""
+    from observer_context import ObserverContext
+    return ObserverContext(city["latitude"], city["longitude"], city["timezone"])
+
+
+# Benchmarks: name -> function(city) where city is a resolve_location() result
+
+def bench_resolve_location(city):
+    locations.resolve_location(city["name"], offline=True)
+
+
+def bench_planets_now(city):
+    from current_planet_position import get_visible_planets
+    ts = ephemeris.get_timescale()
+    get_visible_planets(_observer(city), ts, 10, t=ts.from_datetime(_night(city)))
+
+
+def bench_planets_tonight(city):
+    from planet_viewer import find_visible_planets
+    try:
+        find_visible_planets(_observer(city), _night(city))
+    except ValueError:
+        pass  # Polar day
+
+
+def bench_next_visible(city):
+    from planet_viewer import find_next_visible_dates
+    find_next_visible_dates(_observer(city), "Saturn", cache=False, start_date=BENCH_DATE)
+
+
+def _dso(days, cache=False, same_site=False):
+    def bench_dso(city):
+        from deep_object import find_best_times
+        from observer_context import observer_for
+        # same_site reuses the shared context, as repeated queries for one site do
+        observer = observer_for(city["latitude"], city["longitude"], city["timezone"]) if same_site else _observer(city)
+        list(find_best_times(observer, days, start_date=BENCH_DATE, cache=cache))
+    return bench_dso
+
+
+def bench_sun_monthly(city):
+    from sun_directions import monthly_sun_events
+    monthly_sun_events(_observer(city), BENCH_DATE.year)
+
+
+def bench_sun_daily(city):
+    from sun_directions import daily_sun_events
+    daily_sun_events(_observer(city), BENCH_DATE.year)
+
+
+def _events(count):
+    def bench_events(city):
+        from sun_moon_events import event_stream
+        start = ephemeris.get_timescale().from_datetime(_night(city))
+        stream = event_stream(_observer(city), start=start)
+        list(itertools.islice(stream, count))
+    return bench_events
+
+
+def bench_world_map(city):
+    from visibility_map import altitude_map
+    ts = ephemeris.get_timescale()
+    altitude_map("Moon", ts.from_datetime(_night(city)), os.path.join(locations.CACHE_DIR, "map.npy"), resolution=1.0)
+
+
+def bench_conjunctions(city):
+    from conjunctions import find_conjunctions
+    ts = ephemeris.get_timescale()
+    start = ts.from_datetime(_night(city))
+    find_conjunctions(start, start + 10 * 365.25)
+
+
+def bench_moon_calendar(city):
+    _observer(city).lunar_calendar(BENCH_DATE, 30)
+
+
+def _startup(*command):
+    def bench_startup(city):
+        subprocess.run([sys.executable, *command], check=True, stdout=subprocess.DEVNULL)
+    return bench_startup
+
+
+benchmarks = {
+    "python-startup": _startup("-c", "pass"),
+    "astro-help": _startup(os.path.join(os.path.dirname(os.path.abspath(__file__)), "astro.py"), "--help"),
+    "resolve-location": bench_resolve_location,
+    "planets-now": bench_planets_now,
+    "planets-tonight": bench_planets_tonight,
+    "next-visible": bench_next_visible,
+    "dso-1": _dso(1),
+    "dso-30": _dso(30),
+    "dso-365": _dso(365),
+    "dso-30-cached": _dso(30, cache=True),
+    "dso-30-same-site": _dso(30, same_site=True),
+    "sun-monthly": bench_sun_monthly,
+    "sun-daily": bench_sun_daily,
+    "next-event": _events(1),
+    "next-50-events": _events(50),
+    "world-map-1deg": bench_world_map,
+    "conjunctions-decade": bench_conjunctions,
+    "moon-calendar-30": bench_moon_calendar,
+}
+
+
+def measure(function, cities, repeat):
+    """Time function over every city repeat times; return latency and memory statistics."""
+    # Warm up imports and caches outside the measurement, for every city so the
+    # cached benchmarks time hits rather than first-pass misses
+    for city in cities:
+        function(city)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for city in cities:
+            t0 = time.perf_counter()
+            function(city)
+            latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    # Peak memory comes from a separate pass, as tracing slows the calls down
+    tracemalloc.start()
+    for city in cities:
+        function(city)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "throughput_per_s": len(latencies) / total,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """Return (name, p50_ms, baseline_p50_ms) for benchmarks slower than baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous and result["p50_ms"] > previous["p50_ms"] * (1 + threshold):
+            regressions.append((name, result["p50_ms"], previous["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the astro_events computations offline against a local kernel.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(benchmarks)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the fixture cities per benchmark (default: 3)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed p50 slowdown against the baseline as a fraction (default: 0.25)")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(benchmarks)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    kernel_path = ephemeris.get_loader().path_to(ephemeris.KERNEL)
+    if not os.path.exists(kernel_path):
+        sys.exit(f"❌ Kernel {kernel_path} not found; set ASTRO_EVENTS_KERNEL / ASTRO_EVENTS_DATA_DIR to a local kernel")
+
+    # Geocode the fixtures into a throwaway cache so the user's caches are untouched
+    with tempfile.TemporaryDirectory(prefix="astro_events_bench_") as cache_dir:
+        locations.CACHE_DIR = forecast_cache.CACHE_DIR = cache_dir
+        locations.set_geocoder(FixtureGeocoder())
+        cities = [dict(locations.resolve_location(name), name=name) for name in fixture_cities]
+        ephemeris.warm_up()
+
+        results = {}
+        print(f"{'Benchmark':<18} {'ops/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+        for name in args.names or benchmarks:
+            result = results[name] = measure(benchmarks[name], cities, args.repeat)
+            print(f"{name:<18} {result['throughput_per_s']:9.1f} {result['p50_ms']:9.2f} {result['p90_ms']:9.2f} "
+                  f"{result['p99_ms']:9.2f} {result['peak_memory_mb']:9.1f}")
+
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "kernel": ephemeris.KERNEL,
+        "cities": len(cities),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        for name, p50, previous in regressions:
+            print(f"❌ {name}: p50 {p50:.2f} ms vs {previous:.2f} ms baseline (+{p50 / previous - 1:.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No benchmark slower than the baseline by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
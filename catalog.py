@@ -0,0 +1,178 @@
+import csv
+import hashlib
+from skyfield.api import load, Star
+from skyfield.data import hipparcos
+import numpy as np
+from skyfield.nutationlib import iau2000b_radians
+from horizon_mask import is_mask, mask_altitude
+import metrics
+from windows import refine_roots
+
+
+def catalog_from_objects(objects):
+    """Build a catalog from a {name: (ra_degrees, dec_degrees)} dict such as deep_sky_objects."""
+    radec = np.array(list(objects.values()), dtype=float).reshape(-1, 2)
+    return {"names": list(objects), "ra_degrees": radec[:, 0], "dec_degrees": radec[:, 1]}
+
+
+def catalog_digest(catalog):
+    """Return a short hash of a catalog's names and coordinates, e.g. for cache keys."""
+    digest = hashlib.sha1("\n".join(catalog["names"]).encode("utf-8"))
+    digest.update(np.asarray(catalog["ra_degrees"], dtype=float).tobytes())
+    digest.update(np.asarray(catalog["dec_degrees"], dtype=float).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def load_catalog_csv(path):
+    """Load a catalog from a CSV file with name, ra_degrees and dec_degrees columns (J2000)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return {
+        "names": [row["name"] for row in rows],
+        "ra_degrees": np.array([float(row["ra_degrees"]) for row in rows]),
+        "dec_degrees": np.array([float(row["dec_degrees"]) for row in rows]),
+    }
+
+
+def load_hipparcos_catalog(max_magnitude):
+    """Load the Hipparcos stars brighter than max_magnitude (downloads the catalog on first use)."""
+    with load.open(hipparcos.URL) as f:
+        df = hipparcos.load_dataframe(f)
+    df = df[df["magnitude"] <= max_magnitude]
+    return {
+        "names": [f"HIP {hip}" for hip in df.index],
+        "ra_degrees": df["ra_degrees"].to_numpy(),
+        "dec_degrees": df["dec_degrees"].to_numpy(),
+    }
+
+
+def catalog_altitudes(catalog, eph, topos, times, chunk_size=1024, azimuths_between=None):
+    """Yield (slice, directions, altitudes) for each chunk of the catalog over an array of times.
+
+    altitudes is an (objects x times) array in degrees and directions the
+    (3 x objects) unit apparent direction of each object. Every chunk is one
+    array-valued Star observed once, at the middle of the time span; its
+    apparent directions are then rotated into the local horizon frame at
+    all times together. Aberration drifts well under an arcsecond per day,
+    so this holds for spans of a night or a few weeks. With
+    azimuths_between = (low, high) in degrees, (slice, directions,
+    altitudes, between, azimuths) is yielded instead: between marks the
+    samples with low < altitude <= high and azimuths holds theirs only, as
+    altitudes[between].
+    """
+    observer = eph["earth"] + topos
+    t_mid = times[len(times) // 2]
+    horizon_x, horizon_y, horizon_z = topos.rotation_at(times)  # Local north, east and zenith in GCRS, (3 x times)
+
+    for start in range(0, len(catalog["names"]), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        star = Star(ra_hours=catalog["ra_degrees"][chunk] / 15.0, dec_degrees=catalog["dec_degrees"][chunk])
+        direction = observer.at(t_mid).observe(star).apparent().position.au
+        metrics.count("ephemeris_evaluations")
+        metrics.count("samples", len(star.ra.hours) * len(times))
+        direction = direction / np.linalg.norm(direction, axis=0)
+        sin_alt = np.einsum("jn,jm->nm", direction, horizon_z)
+        altitudes = np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+        if azimuths_between is None:
+            yield chunk, direction, altitudes
+            continue
+        low, high = azimuths_between
+        between = (altitudes > low) & (altitudes <= high)
+        east, north = np.einsum("jn,jm->nm", direction, horizon_y), np.einsum("jn,jm->nm", direction, horizon_x)
+        yield chunk, direction, altitudes, between, np.degrees(np.arctan2(east[between], north[between])) % 360.0
+
+
+def refine_peaks(directions, topos, times, altitudes, best, refine, epsilon=1 / 86400):
+    """Return the TT and altitude of each object's highest point near sample best.
+
+    directions and altitudes are as yielded by catalog_altitudes. Where
+    refine is set the transit is bracketed by the samples either side of
+    best and solved with windows.refine_roots; elsewhere the sample itself
+    is kept.
+    """
+    ts, jd = times.ts, times.tt
+    rows = np.arange(len(best))
+    best_time, peak_altitude = jd[best], altitudes[rows, best]
+    refine = refine & (best > 0) & (best < len(jd) - 1)
+    h = min((jd[-1] - jd[0]) / (len(jd) - 1) / 10, 1 / 1440)
+    # Nutation and the equation of the equinoxes barely move within the span:
+    # interpolate them from the samples instead of evaluating their series
+    dpsi, deps = iau2000b_radians(times)
+    equinoxes = (times.gast - times.gmst + 12.0) % 24.0 - 12.0
+
+    def altitude(x, rows):
+        t = ts.tt_jd(x)
+        t._nutation_angles_radians = np.interp(x, jd, dpsi), np.interp(x, jd, deps)
+        t.gast = t.gmst + np.interp(x, jd, equinoxes)
+        zenith = topos.rotation_at(t)[2]
+        sin_alt = np.einsum("jn,jn->n", directions[:, rows], zenith)
+        return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+    def climb(x, rows):
+        # Central difference of the altitude, both sides in one evaluation
+        values = altitude(np.concatenate([x + h, x - h]), np.concatenate([rows, rows]))
+        return values[:len(x)] - values[len(x):]
+
+    rows = rows[refine]
+    if not len(rows):
+        return best_time, peak_altitude
+    a, b = jd[best[rows] - 1], jd[best[rows] + 1]
+    ends = climb(np.concatenate([a, b]), np.concatenate([rows, rows]))
+    # Only a rising then setting bracket holds a transit
+    bracketed = (ends[:len(rows)] > 0) & (ends[len(rows):] < 0)
+    rows, a, b = rows[bracketed], a[bracketed], b[bracketed]
+    fa, fb = ends[:len(bracketed)][bracketed], ends[len(bracketed):][bracketed]
+    transit = refine_roots(lambda x: climb(x, rows), a, b, fa, fb, epsilon)
+    best_time[rows] = transit
+    peak_altitude[rows] = altitude(transit, rows)
+    return best_time, peak_altitude
+
+
+def catalog_visibility(catalog, eph, topos, times, threshold_degrees=10, chunk_size=1024):
+    """Return per-object visibility, best time index and peak altitude over an array of times.
+
+    The result is a dict of arrays with one entry per catalog object:
+    "visible" (ever above threshold_degrees), "best_index" (index into
+    times of the highest sample), "best_time" (TT of the highest altitude,
+    solved between samples by refine_peaks) and "peak_altitude" in degrees.
+    threshold_degrees may also be a horizon_mask table; objects are then
+    visible when they clear its skyline, and best at their highest while
+    clear of it.
+    """
+    count = len(catalog["names"])
+    best_index = np.zeros(count, dtype=int)
+    best_time = np.empty(count)
+    peak_altitude = np.empty(count)
+
+    if is_mask(threshold_degrees):
+        # Samples above the highest point of the skyline clear it and those below
+        # its lowest point do not; only the ones in between need an azimuth
+        visible = np.zeros(count, dtype=bool)
+        low, high = float(np.min(threshold_degrees)), float(np.max(threshold_degrees))
+        for chunk, directions, altitudes, between, azimuths in catalog_altitudes(catalog, eph, topos, times, chunk_size, (low, high)):
+            clear = altitudes > high
+            clear[between] = altitudes[between] > mask_altitude(threshold_degrees, azimuths)
+            visible[chunk] = clear.any(axis=1)
+            best = np.where(clear, altitudes, -np.inf).argmax(axis=1)
+            best_index[chunk] = best
+            # A best sample with a clear neighbour on each side is a transit; one
+            # next to the skyline is where the object goes behind it, so keep it
+            rows = np.arange(len(best))
+            inner = np.clip(best, 1, len(times) - 2)
+            refine = visible[chunk] & clear[rows, inner - 1] & clear[rows, inner + 1]
+            best_time[chunk], peak_altitude[chunk] = refine_peaks(directions, topos, times, altitudes, best, refine)
+        return {"visible": visible, "best_index": best_index, "best_time": best_time, "peak_altitude": peak_altitude}
+
+    for chunk, directions, altitudes in catalog_altitudes(catalog, eph, topos, times, chunk_size):
+        best = altitudes.argmax(axis=1)
+        best_index[chunk] = best
+        # Objects below the threshold at every sample may still clear it near their transit
+        refine = altitudes[np.arange(len(best)), best] > threshold_degrees - 1.0
+        best_time[chunk], peak_altitude[chunk] = refine_peaks(directions, topos, times, altitudes, best, refine)
+
+    return {
+        "visible": peak_altitude > threshold_degrees,
+        "best_index": best_index,
+        "best_time": best_time,
+        "peak_altitude": peak_altitude,
+    }
@@ -0,0 +1,170 @@
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from deep_object import deep_sky_objects
+from ephemeris import get_ephemeris, get_timescale
+from planet_viewer import planet_map
+from windows import refine_roots
+import metrics
+import output
+
+# Bodies that move against the stars: display name -> kernel key
+moving_bodies = {"Moon": "moon", **planet_map}
+
+
+def fixed_directions(objects):
+    """Return (objects x 3) ICRS unit vectors for a {name: (ra_degrees, dec_degrees)} dict such as deep_sky_objects."""
+    ra, dec = np.radians(np.array(list(objects.values()), dtype=float).reshape(-1, 2)).T
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=1)
+
+
+def geocentric_directions(eph, names, t):
+    """Return (bodies x 3 x times) astrometric geocentric unit vectors in ICRS at an array Time."""
+    earth_at = eph["earth"].at(t)
+    xyz = np.array([earth_at.observe(eph[moving_bodies[name]]).position.au for name in names])
+    metrics.observed(t, len(names))
+    return xyz / np.linalg.norm(xyz, axis=1)[:, None]
+
+
+def body_pairs(moving_count, fixed_count):
+    """Return index arrays (first, second) of every pair worth searching.
+
+    Indices count the moving bodies first, then the fixed objects: every
+    two moving bodies are paired, and every moving body with every fixed
+    object. Two fixed objects never change their separation.
+    """
+    first, second = np.triu_indices(moving_count, 1)
+    body, obj = np.meshgrid(np.arange(moving_count), moving_count + np.arange(fixed_count), indexing="ij")
+    return np.concatenate([first, body.ravel()]), np.concatenate([second, obj.ravel()])
+
+
+def angle_from_dot(dot):
+    """Return the angle in degrees between unit vectors from their dot product, accurate down to small angles."""
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip((1 - dot) / 2, 0.0, 1.0))))
+
+
+def pair_separations(directions, fixed, first, second):
+    """Return the (pairs x times) separations in degrees from geocentric_directions and fixed_directions output.
+
+    The dot products of all moving bodies with each other and with every
+    fixed object are formed once per time, then the pairs are picked out.
+    """
+    moving = np.einsum("ikn,jkn->ijn", directions, directions)
+    with_fixed = np.einsum("ikn,jk->ijn", directions, fixed)
+    dots = np.concatenate([moving, with_fixed], axis=1)
+    return angle_from_dot(dots[first, second])
+
+
+def find_conjunctions(start, end, threshold=1.0, names=None, objects=None, step_days=1.0, epsilon=1 / 86400):
+    """Find the close approaches between Skyfield Times start and end; return them in time order.
+
+    names are moving_bodies to pair with each other and with the fixed
+    objects, a {name: (ra_degrees, dec_degrees)} dict (default: all
+    moving bodies and deep_sky_objects; pass {} for bodies only).
+    Separations are geocentric. Every pair is sampled every step_days in
+    one (pairs x times) array, each local minimum that could dip below
+    threshold degrees is bracketed from the samples, and all of them are
+    refined together. Returns (utc datetime, first name, second name,
+    separation in degrees) for the minima closer than threshold.
+    """
+    ts = get_timescale()
+    eph = get_ephemeris()
+    names = list(moving_bodies) if names is None else list(names)
+    objects = deep_sky_objects if objects is None else objects
+    all_names = names + list(objects)
+    fixed = fixed_directions(objects)
+    first, second = body_pairs(len(names), len(objects))
+
+    # One extra sample beyond each end, so minima near start or end are bracketed too
+    jd = np.concatenate([[start.tt - step_days], np.arange(start.tt, end.tt, step_days), [end.tt, end.tt + step_days]])
+    sep = pair_separations(geocentric_directions(eph, names, ts.tt_jd(jd)), fixed, first, second)
+
+    # A sample lower than both neighbours brackets a minimum. The true minimum
+    # can lie below the sample by up to the change over one step.
+    pair, k = np.nonzero((sep[:, 1:-1] < sep[:, :-2]) & (sep[:, 1:-1] <= sep[:, 2:]))
+    k += 1
+    change = np.maximum(sep[pair, k - 1] - sep[pair, k], sep[pair, k + 1] - sep[pair, k])
+    keep = sep[pair, k] - change < threshold
+    pair, k = pair[keep], k[keep]
+    metrics.count("conjunction_candidates", len(pair))
+
+    def separation_at(x, pairs):
+        # Separation of each pair at its own TT date, observing each body only at the dates of its pairs
+        i, j = first[pairs], second[pairs]
+        a, b = np.empty((len(x), 3)), np.empty((len(x), 3))
+        b[j >= len(names)] = fixed[j[j >= len(names)] - len(names)]
+        for body, name in enumerate(names):
+            needed = (i == body) | (j == body)
+            if needed.any():
+                xyz = geocentric_directions(eph, [name], ts.tt_jd(x[needed]))[0].T
+                a[i == body] = xyz[(i == body)[needed]]
+                b[j == body] = xyz[(j == body)[needed]]
+        return angle_from_dot(np.einsum("nk,nk->n", a, b))
+
+    h = min(step_days / 10, 1 / 1440)
+
+    def closing(x, pairs):
+        # Central difference of the separation, both sides in one evaluation
+        values = separation_at(np.concatenate([x + h, x - h]), np.concatenate([pairs, pairs]))
+        return values[:len(x)] - values[len(x):]
+
+    a, b = jd[k - 1], jd[k + 1]
+    ends = closing(np.concatenate([a, b]), np.concatenate([pair, pair])) if len(pair) else np.zeros(0)
+    minima = refine_roots(lambda x: closing(x, pair), a, b, ends[:len(a)], ends[len(a):], epsilon)
+    closest = separation_at(minima, pair) if len(pair) else np.zeros(0)
+
+    found = np.flatnonzero((closest < threshold) & (minima >= start.tt) & (minima <= end.tt))
+    found = found[np.argsort(minima[found])]
+    times = ts.tt_jd(minima[found]).utc_datetime() if len(found) else []
+    return [
+        (time, all_names[first[pair[i]]], all_names[second[pair[i]]], closest[i])
+        for time, i in zip(times, found)
+    ]
+
+
+def conjunction_rows(events):
+    for time, first, second, separation in events:
+        yield {"time": time, "first": first, "second": second, "separation": separation}
+
+
+conjunction_fields = ("time", "first", "second", "separation")
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Find conjunctions of the Moon, planets and deep-sky objects.")
+    parser.add_argument("--start", help="First day to search as YYYY-MM-DD (default: today)")
+    parser.add_argument("--years", type=float, default=1, help="Number of years to search (default: 1)")
+    parser.add_argument("--threshold", type=float, default=1, help="Maximum separation in degrees (default: 1)")
+    parser.add_argument("--bodies", nargs="+", choices=list(moving_bodies), default=list(moving_bodies), metavar="BODY",
+                        help="Moving bodies to pair: Moon or a planet name (default: all)")
+    parser.add_argument("--no-dso", action="store_true", help="Only pair the bodies with each other, not with deep-sky objects")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.session(args):
+        ts = get_timescale()
+        first_day = datetime.fromisoformat(args.start) if args.start else datetime.now(timezone.utc)
+        start = ts.from_datetime(first_day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc))
+        end = start + args.years * 365.25
+
+        with metrics.span("compute"):
+            events = find_conjunctions(start, end, args.threshold, args.bodies, {} if args.no_dso else None)
+
+        if args.format != "text":
+            output.write_rows(conjunction_rows(events), args.format, conjunction_fields, timezone.utc)
+            return
+
+        with metrics.span("render"):
+            print(f"🔭 Conjunctions closer than {args.threshold}° from {start.utc_strftime('%Y-%m-%d')} "
+                  f"to {end.utc_strftime('%Y-%m-%d')}:\n")
+            for time, first, second, separation in events:
+                print(f"  {time:%Y-%m-%d %H:%M} UTC  {first} – {second}: {separation:.2f}°")
+            if not events:
+                print("  None found.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,161 @@
 import argparse
-from skyfield.api import load, Topos
+import numpy as np
 from datetime import datetime
-from geopy.geocoders import Nominatim
-
-# Load ephemeris and planet data
-eph = load('de421.bsp')
-planets = eph
-ts = load.timescale()
+from ephemeris import get_ephemeris, get_timescale
+from horizon_mask import load_mask, minimum_altitude
+from observer_context import observer_for_city
+import metrics
+import output
 
+# Map display names to kernel keys; the ephemeris is loaded on first use
 planet_names = {
-    'Mercury': planets['mercury'],
-    'Venus': planets['venus'],
-    'Mars': planets['mars'],
-    'Jupiter': planets['jupiter barycenter'],
-    'Saturn': planets['saturn barycenter'],
-    'Uranus': planets['uranus barycenter'],
-    'Neptune': planets['neptune barycenter']
+    'Mercury': 'mercury barycenter',
+    'Venus': 'venus barycenter',
+    'Mars': 'mars barycenter',
+    'Jupiter': 'jupiter barycenter',
+    'Saturn': 'saturn barycenter',
+    'Uranus': 'uranus barycenter',
+    'Neptune': 'neptune barycenter'
 }
+snapshot_bodies = {'Sun': 'sun', **planet_names}
+
+def get_observer(city_name, offline=False):
+    """Returns the ObserverContext of a city name using the shared location cache."""
+    return observer_for_city(city_name, offline=offline)
+
+def sky_snapshot(observer, t, min_angle=10, names=None, precision="high"):
+    """Return the Sun and planets as seen by observer at t, as a dict of arrays.
+
+    t may be a single time or an array of times. The result has "names"
+    (Sun first) and "alt", "az", "distance" and "visible" (alt > min_angle)
+    arrays of shape (bodies,) or (bodies x times); min_angle may also be a
+    horizon_mask table, which alt must clear at az. Pass names to restrict
+    it to some of the bodies. precision="low" uses the analytic series in
+    fast_ephemeris (arcminute accuracy) and never loads the kernel;
+    precision="tables" interpolates the tables set in geocentric_tables
+    (sub-arcsecond accuracy).
+    """
+    names = list(snapshot_bodies) if names is None else list(names)
+    if precision != "high":
+        if precision == "low":
+            from fast_ephemeris import fast_altaz
+            alt, az, distance = fast_altaz(names, observer.latitude, observer.longitude, t, observer.elevation,
+                                           observer.itrs_xyz)
+        else:
+            from geocentric_tables import get_tables, topocentric_altaz
+            alt, az, distance = topocentric_altaz(get_tables(), observer.latitude, observer.longitude, t,
+                                                  observer.elevation, names, observer.itrs_xyz)
+        metrics.observed(t, len(names))
+        if not t.shape:
+            alt, az, distance = alt[:, 0], az[:, 0], distance[:, 0]
+        return {"names": names, "time": t, "alt": alt, "az": az, "distance": distance,
+                "visible": alt > minimum_altitude(min_angle, az)}
 
-def get_observer(city_name):
-    """Returns a Skyfield Topos object for a city name using geopy."""
-    geolocator = Nominatim(user_agent="planet_viewer")
-    location = geolocator.geocode(city_name)
-    if not location:
-        raise ValueError("Could not find the specified city.")
-    return Topos(latitude_degrees=location.latitude, longitude_degrees=location.longitude)
+    planets = get_ephemeris()
+    observer_at = observer.vector.at(t)
+    # One SPK chain per body, then all bodies go to the horizon frame together
+    xyz = np.array([observer_at.observe(planets[snapshot_bodies[name]]).apparent().xyz.au for name in names])
+    metrics.observed(t, len(names))
+    horizon = np.einsum("ij...,bj...->bi...", observer.topos.rotation_at(t), xyz)
+    distance = np.sqrt((horizon ** 2).sum(axis=1))
+    alt = np.degrees(np.arcsin(horizon[:, 2] / distance))
+    az = np.degrees(np.arctan2(horizon[:, 1], horizon[:, 0])) % 360.0
+    return {"names": names, "time": t, "alt": alt, "az": az, "distance": distance,
+            "visible": alt > minimum_altitude(min_angle, az)}
 
-def check_single_planet(observer, ts, planet_name, min_angle):
+def check_single_planet(observer, ts, planet_name, min_angle, precision="high"):
     """Check visibility of a single planet."""
     name = planet_name.capitalize()
     if name not in planet_names:
         raise ValueError(f"Unknown planet: {name}")
-    planet = planet_names[name]
-    now = ts.now()
-    astrometric = (planets['earth'] + observer).at(now).observe(planet)
-    alt, az, distance = astrometric.apparent().altaz()
-    return (alt.degrees > min_angle, alt.degrees, az.degrees)
-
-def get_visible_planets(observer, ts, min_angle):
-    """Return a list of currently visible planets above the altitude threshold."""
-    visible = []
-    now = ts.now()
-    for name, planet in planet_names.items():
-        astrometric = (planets['earth'] + observer).at(now).observe(planet)
-        alt, az, distance = astrometric.apparent().altaz()
-        if alt.degrees > min_angle:
-            visible.append((name, alt.degrees, az.degrees))
-    return visible
-
-
-def main():
-    parser = argparse.ArgumentParser(description="Show planets visible in the night sky from a given city.")
+    snapshot = sky_snapshot(observer, ts.now(), min_angle, names=[name], precision=precision)
+    return (snapshot["visible"][0], snapshot["alt"][0], snapshot["az"][0])
+
+def get_visible_planets(observer, ts, min_angle, precision="high", t=None):
+    """Return a list of planets visible at t (default: now) above the altitude threshold."""
+    snapshot = sky_snapshot(observer, ts.now() if t is None else t, min_angle, names=planet_names, precision=precision)
+    return [
+        (name, alt, az)
+        for name, alt, az, visible in zip(snapshot["names"], snapshot["alt"], snapshot["az"], snapshot["visible"])
+        if visible
+    ]
+
+def get_sky_status(observer, ts, min_angle, precision="high"):
+    """Return whether it is daytime and (name, alt, az, visible) for every planet."""
+    snapshot = sky_snapshot(observer, ts.now(), min_angle, precision=precision)
+    # Sun position to determine day/night
+    is_daytime = snapshot["alt"][0] > 0
+    positions = list(zip(snapshot["names"][1:], snapshot["alt"][1:], snapshot["az"][1:], snapshot["visible"][1:]))
+    return is_daytime, positions
+
+# Output fields for --format
+position_fields = ("name", "altitude", "azimuth", "visible")
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Show planets visible in the night sky from a given city.")
     parser.add_argument('--city', type=str, required=True, help="City name (e.g. 'New York')")
     parser.add_argument('--planet', type=str, help="Optional specific planet name")
     parser.add_argument('--min-angle', type=float, default=10,
                         help="Minimum altitude angle in degrees (default: 10)")
-    args = parser.parse_args()
-
-    try:
-        observer = get_observer(args.city)
-    except ValueError as e:
-        print(e)
-        return
+    parser.add_argument('--horizon-mask', metavar='FILE',
+                        help="Skyline file of 'azimuth altitude' lines to clear instead of --min-angle")
+    parser.add_argument('--offline', action='store_true', help="Resolve the city from the local cache only")
+    parser.add_argument('--fast', action='store_true',
+                        help="Use low-precision analytic positions (arcminute accuracy, no kernel file)")
+    parser.add_argument('--tables', metavar='FILE',
+                        help="Interpolate positions from tables written by geocentric_tables.py")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
 
-    if args.planet and args.planet.lower() != 'all':
+    with metrics.session(args):
         try:
-            visible, alt, az = check_single_planet(observer, ts, args.planet, args.min_angle)
-            if visible:
-                print(f"{args.planet.capitalize()} is currently visible at altitude {alt:.2f}° and azimuth {az:.2f}°.")
-            else:
-                print(f"{args.planet.capitalize()} is currently below {args.min_angle}° altitude and likely not visible.")
+            observer = get_observer(args.city, offline=args.offline)
         except ValueError as e:
-            print(e)
-    else:
-        now = ts.now()
-        # Sun position to determine day/night
-        sun = planets['sun']
-        astrometric_sun = (planets['earth'] + observer).at(now).observe(sun)
-        alt_sun, _, _ = astrometric_sun.apparent().altaz()
-        is_daytime = alt_sun.degrees > 0
-
-        print(f"It is currently {'🌞 Daytime' if is_daytime else '🌙 Nighttime'} at {args.city}.\n")
-        print(f"Planets in {args.city}:")
-
-        for name, planet in planet_names.items():
-            astrometric = (planets['earth'] + observer).at(now).observe(planet)
-            alt, az, _ = astrometric.apparent().altaz()
-            is_visible = alt.degrees > args.min_angle
-            status = "✅ Visible" if is_visible else "❌ Not Visible"
-            print(f"- {name}: {alt.degrees:.1f}° alt, {az.degrees:.1f}° az — {status}")
+            output.report_error(str(e), args.format)
+            return
+
+        ts = get_timescale()
+        precision = "low" if args.fast else "high"
+        if args.tables:
+            from geocentric_tables import set_tables
+            set_tables(args.tables)
+            precision = "tables"
+        min_angle = load_mask(args.horizon_mask) if args.horizon_mask else args.min_angle
+
+        if args.planet and args.planet.lower() != 'all':
+            try:
+                with metrics.span("compute"):
+                    visible, alt, az = check_single_planet(observer, ts, args.planet, min_angle, precision)
+                if args.format != "text":
+                    row = {"name": args.planet.capitalize(), "altitude": alt, "azimuth": az, "visible": visible}
+                    output.write_rows([row], args.format, position_fields)
+                    return
+                with metrics.span("render"):
+                    if visible:
+                        print(f"{args.planet.capitalize()} is currently visible at altitude {alt:.2f}° and azimuth {az:.2f}°.")
+                    else:
+                        limit = "the horizon mask" if args.horizon_mask else f"{args.min_angle}° altitude"
+                        print(f"{args.planet.capitalize()} is currently below {limit} and likely not visible.")
+            except ValueError as e:
+                output.report_error(str(e), args.format)
+        else:
+            with metrics.span("compute"):
+                is_daytime, positions = get_sky_status(observer, ts, min_angle, precision)
+            if args.format != "text":
+                rows = ({"name": name, "altitude": alt, "azimuth": az, "visible": is_visible, "daytime": is_daytime}
+                        for name, alt, az, is_visible in positions)
+                output.write_rows(rows, args.format, position_fields + ("daytime",))
+                return
+
+            with metrics.span("render"):
+                print(f"It is currently {'🌞 Daytime' if is_daytime else '🌙 Nighttime'} at {args.city}.\n")
+                print(f"Planets in {args.city}:")
 
+                for name, alt, az, is_visible in positions:
+                    status = "✅ Visible" if is_visible else "❌ Not Visible"
+                    print(f"- {name}: {alt:.1f}° alt, {az:.1f}° az — {status}")
 
 if __name__ == "__main__":
     main()
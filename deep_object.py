@@ -1,11 +1,15 @@
 import argparse
-from skyfield.api import load, Topos, Star, utc, wgs84
-from skyfield.data import hipparcos
-from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
-from datetime import datetime, timedelta, time
-import pytz
+from datetime import datetime, timedelta
 import numpy as np
+from ephemeris import get_ephemeris
+import ephemeris
+from catalog import catalog_digest, catalog_from_objects, load_catalog_csv, load_hipparcos_catalog, catalog_visibility
+import forecast_cache
+from horizon_mask import load_mask, threshold_key
+from moon_calendar import moon_up_fraction
+from observer_context import observer_for_city
+import metrics
+import output
 
 # Define known Deep Sky Objects (DSOs) with approximate RA/Dec (J2000)
 deep_sky_objects = {
@@ -23,95 +27,166 @@ deep_sky_objects = {
     "Messier 42 (Orion Nebula)": (83.822, -5.391),
 }
 
-def parse_args():
-    parser = argparse.ArgumentParser(description="Get visible deep-sky objects and best viewing times.")
+# Nights when a Moon at least this illuminated is up for at least half of the
+# dark evening are flagged as moonlit: its glow washes out faint objects
+MOONLIGHT_ILLUMINATION = 0.5
+
+def parse_args(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Get visible deep-sky objects and best viewing times.")
     parser.add_argument("city", help="City name (e.g., 'Cincinnati')")
     parser.add_argument("--days", type=int, default=1, help="Number of days to forecast (default: 1)")
-    return parser.parse_args()
-
-def get_location(city_name):
-    geolocator = Nominatim(user_agent="deep_object_locator")
-    location = geolocator.geocode(city_name)
-    if not location:
-        raise ValueError(f"Could not find location for city: {city_name}")
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lng=location.longitude, lat=location.latitude)
-    timezone = pytz.timezone(timezone_str)
-    return location.latitude, location.longitude, timezone
-
-def is_object_visible(obj, observer, ts, start_time, end_time, threshold_degrees=10):
-    # Create an array of evenly spaced times between start and end
-    time_range = [start_time + (end_time - start_time) * i / 19 for i in range(20)]
-    times = ts.utc(time_range)
-    
-    # Calculate altitudes
-    altitudes = observer.at(times).observe(obj).apparent().altaz()[0].degrees
-
-    # Determine if it's ever visible and when it's best (max altitude)
-    if np.any(altitudes > threshold_degrees):
-        best_idx = np.argmax(altitudes)
-        return True, times[best_idx].utc_datetime()
-    else:
-        return False, None
-
-def main():
-    args = parse_args()
-
-    # Load timescale and ephemeris
-    ts = load.timescale()
+    parser.add_argument("--step", type=float, default=5, help="Sampling step in minutes (default: 5)")
+    parser.add_argument("--catalog", help="CSV file of objects (name, ra_degrees, dec_degrees) to use instead of the built-in list")
+    parser.add_argument("--offline", action="store_true", help="Resolve the city from the local cache only")
+    parser.add_argument("--hipparcos", type=float, metavar="MAG", help="Use Hipparcos stars brighter than this magnitude instead of the built-in list")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every night instead of reusing cached results")
+    parser.add_argument("--horizon-mask", metavar="FILE",
+                        help="Skyline file of 'azimuth altitude' lines to clear instead of a flat 10°")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def find_best_times(observer, days=1, catalog=None, step_minutes=5, start_date=None, cache=True,
+                    chunk_nights=30, threshold=10):
+    """Yield (date, condition, [(name, best_time), ...], moon) for each night of the forecast.
+
+    best_time is a UTC datetime. condition is "normal", "polar_day" or
+    "polar_night" as in twilight.find_twilight. moon is a dict of the Moon's
+    "illumination" at midnight, the fraction of the dark evening it is up
+    ("up_fraction") and whether it is "moonlit".
+    Nights are computed chunk_nights at a time as the generator is consumed,
+    so long forecasts start producing at once and hold only one chunk.
+    With cache=True nights computed by earlier runs come from forecast_cache
+    and only the others are computed. threshold is the altitude objects must
+    clear, in degrees or as a horizon_mask table.
+    """
+    if catalog is None:
+        catalog = catalog_from_objects(deep_sky_objects)
+    if start_date is None:
+        start_date = observer.today()
+    timezone = observer.timezone
+    params = {"catalog": catalog_digest(catalog), "threshold": threshold_key(threshold), "step": step_minutes,
+              "kernel": ephemeris.KERNEL, "timezone": timezone.zone, "layout": 3}
+
+    def compute(dates):
+        return evening_visibility(observer, catalog, step_minutes, dates, threshold)
+
+    for chunk_start in range(0, days, chunk_nights):
+        dates = [start_date + timedelta(days=i) for i in range(chunk_start, min(chunk_start + chunk_nights, days))]
+        if cache:
+            cached = forecast_cache.cached_nights("dso", observer.latitude, observer.longitude, dates, params,
+                                                  lambda missing: dict(compute(missing)))
+            nights = ((day, cached[day]) for day in dates)
+        else:
+            nights = compute(dates)
+
+        for day, night in nights:
+            best_times = [(name, datetime.fromisoformat(best)) for name, best, _ in night["objects"]]
+            illumination, up_fraction = night["moon"]
+            moon = {"illumination": illumination, "up_fraction": up_fraction,
+                    "moonlit": illumination >= MOONLIGHT_ILLUMINATION and up_fraction >= 0.5}
+            yield day, night["condition"], best_times, moon
+
+def dso_rows(nights):
+    """Flatten find_best_times() nights into one output row per object, or one per night without any."""
+    for day, condition, best_times, moon in nights:
+        night = {"date": day, "condition": condition, "moon_illumination": moon["illumination"], "moonlit": moon["moonlit"]}
+        if not best_times:
+            yield {**night, "name": None, "best_time": None}
+        for name, best_time in best_times:
+            yield {**night, "name": name, "best_time": best_time}
+
+dso_fields = ("date", "condition", "moon_illumination", "moonlit", "name", "best_time")
+
+def evening_visibility(observer, catalog, step_minutes, dates, threshold=10):
+    """Yield (date, night) for the given dates, computed lazily one evening at a time.
+
+    night is a JSON-ready dict: "condition", "dark_start" (TT or None),
+    "moon", [illumination at midnight, fraction of the dark evening the Moon
+    is up], and "objects", a list of [name, best time as UTC ISO string,
+    peak altitude] for the catalog objects above threshold between dark and
+    midnight.
+    """
+    eph = get_ephemeris()
+
+    # Sunset and twilight for every night from the first to the last date in one search
+    first = min(dates)
+    nights = observer.twilight(first, (max(dates) - first).days + 1)
+    moon = observer.lunar_calendar(first, (max(dates) - first).days + 1)
+
+    for day in dates:
+        day_offset = (day - first).days
+        condition = nights["condition"][day_offset]
+        dark_start = nights["dark_start"][day_offset]
+        night = {"condition": condition, "dark_start": None if np.isnan(dark_start) else dark_start,
+                 "moon": [float(moon["illumination"][day_offset]), 0.0], "objects": []}
+        if condition == "polar_day":
+            yield day, night
+            continue
+        night["moon"][1] = moon_up_fraction(moon, dark_start, moon["midnight"][day_offset])
+
+        # Darkness starts at sunset, or at local noon during polar night
+        times = observer.evening_samples(day, step_minutes)
+        if times is None:
+            yield day, night  # No darkness before midnight
+            continue
+
+        # Evaluate every object at every sample of the evening in one pass
+        result = catalog_visibility(catalog, eph, observer.topos, times, threshold)
 
+        visible = np.flatnonzero(result["visible"])
+        best_times = times.ts.tt_jd(result["best_time"][visible]).utc_datetime() if len(visible) else []
+        night["objects"] = [
+            [catalog["names"][i], best.isoformat(), result["peak_altitude"][i]]
+            for i, best in zip(visible, best_times)
+        ]
+        yield day, night
+
+def main(argv=None, prog=None):
+    args = parse_args(argv, prog)
+    with metrics.session(args):
+        run(args)
+
+def run(args):
     # Get observer's location
     try:
-        latitude, longitude, timezone = get_location(args.city)
+        observer = observer_for_city(args.city, offline=args.offline)
     except Exception as e:
-        print(f"❌ Error: {e}")
+        output.report_error(f"❌ Error: {e}", args.format)
         return
 
-    observer_location = wgs84.latlon(latitude, longitude)
-
-    print(f"\n📍 Location: {args.city} ({latitude:.2f}, {longitude:.2f}) | Timezone: {timezone.zone}\n")
-
-    now_local = datetime.now(timezone)
-    eph = load('de440s.bsp')  # Needed for Earth/Sun
-    earth = eph["earth"]
-    sun = eph["sun"]
-
-    for day_offset in range(args.days):
-        day = now_local + timedelta(days=day_offset)
-        date_str = day.strftime("%Y-%m-%d")
-        print(f"\n🗓️  {date_str}")
-
-        # Define local sunset and midnight
-        t0 = timezone.localize(datetime.combine(day.date(), time(12)))
-        t_ts = ts.from_datetime(t0)
-        observer = earth + observer_location
-        sunset_time = observer.at(t_ts).observe(sun).apparent().altaz()[0].degrees
-        sunset = None
-        for minute in range(1440):
-            dt = t0 + timedelta(minutes=minute)
-            t = ts.from_datetime(dt)
-            alt = observer.at(t).observe(sun).apparent().altaz()[0].degrees
-            if alt < -0.833:
-                sunset = dt
-                break
-        if sunset is None:
-            print("☀️  No sunset found!")
-            continue
+    with metrics.span("load_catalog"):
+        if args.catalog:
+            catalog = load_catalog_csv(args.catalog)
+        elif args.hipparcos is not None:
+            catalog = load_hipparcos_catalog(args.hipparcos)
+        else:
+            catalog = catalog_from_objects(deep_sky_objects)
+
+    threshold = load_mask(args.horizon_mask) if args.horizon_mask else 10
+    nights = metrics.spanned("compute", find_best_times(observer, args.days, catalog, args.step,
+                                                        cache=not args.no_cache, threshold=threshold))
+    if args.format != "text":
+        output.write_rows(dso_rows(nights), args.format, dso_fields, observer.timezone)
+        return
 
-        midnight = timezone.localize(datetime.combine(day.date(), time(23, 59)))
+    print(f"\n📍 Location: {args.city} ({observer.latitude:.2f}, {observer.longitude:.2f}) "
+          f"| Timezone: {observer.timezone.zone}\n")
 
-        # Check visibility of each DSO
-        for name, (ra, dec) in deep_sky_objects.items():
-            star = Star(ra_hours=ra / 15.0, dec_degrees=dec)
-            # Convert sunset and midnight to UTC naive datetimes
-            sunset_utc = sunset.astimezone(utc)
-            midnight_utc = midnight.astimezone(utc)
+    # Each night is printed as soon as it is computed
+    for day, condition, best_times, moon in nights:
+        with metrics.span("render"):
+            print(f"\n🗓️  {day.strftime('%Y-%m-%d')}")
+            if condition == "polar_day":
+                print("☀️  Polar day: the Sun does not set tonight.")
+                continue
+            if condition == "polar_night":
+                print("🌑 Polar night: the Sun stays below the horizon.")
+            if moon["moonlit"]:
+                print(f"🌕 Moonlit: the Moon is {moon['illumination']:.0%} lit and up for most of the evening; faint objects are washed out.")
 
-            visible, best_time = is_object_visible(star, observer, ts, sunset_utc, midnight_utc)
-            if visible:
-                best_time_local = best_time.astimezone(timezone).strftime("%H:%M")
-                print(f"   ✨ {name} → Best time: {best_time_local}")
+            for name, best_time in best_times:
+                print(f"   ✨ {name} → Best time: {best_time.astimezone(observer.timezone):%H:%M}")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,112 @@
+import argparse
+import os
+import threading
+
+import metrics
+
+# One kernel for every script; override with ASTRO_EVENTS_KERNEL and
+# ASTRO_EVENTS_DATA_DIR (where kernels are looked up and downloaded)
+KERNEL = os.environ.get("ASTRO_EVENTS_KERNEL", "de440s.bsp")
+DATA_DIR = os.environ.get("ASTRO_EVENTS_DATA_DIR", ".")
+
+# Bodies every script needs, by NAIF code (Sun, Moon, Earth and the planet barycenters)
+REQUIRED_TARGETS = (1, 2, 3, 4, 5, 6, 7, 8, 10, 301, 399)
+
+_lock = threading.Lock()
+_loader = None
+_ephemeris = None
+_timescale = None
+
+
+def set_kernel(kernel):
+    """Switch to another kernel file; it is loaded on the next get_ephemeris() call."""
+    global KERNEL, _ephemeris
+    with _lock:
+        KERNEL = kernel
+        _ephemeris = None
+
+
+def get_loader():
+    global _loader
+    if _loader is None:
+        from skyfield.api import Loader
+        _loader = Loader(DATA_DIR, verbose=False)
+    return _loader
+
+
+def get_ephemeris():
+    """Return the configured kernel, opened once per process.
+
+    Skyfield opens SPK files through jplephem, which memory-maps the
+    segment coefficients instead of reading them into memory, so only
+    the pages a computation touches are faulted in and every process
+    using the same file shares them through the page cache.
+    """
+    global _ephemeris
+    if _ephemeris is None:
+        with _lock:
+            if _ephemeris is None:
+                with metrics.span("load_ephemeris"):
+                    _ephemeris = get_loader()(KERNEL)
+    return _ephemeris
+
+
+def get_timescale():
+    """Return the Skyfield timescale, built once per process."""
+    global _timescale
+    if _timescale is None:
+        with _lock:
+            if _timescale is None:
+                with metrics.span("load_timescale"):
+                    _timescale = get_loader().timescale()
+    return _timescale
+
+
+def warm_up():
+    """Load the kernel and timescale now, e.g. as a worker process initializer."""
+    get_timescale()
+    get_ephemeris()
+
+
+def truncate_kernel(start_year, end_year, output=None, source=None):
+    """Write an excerpt of a kernel covering only start_year through end_year.
+
+    Only REQUIRED_TARGETS are kept. Returns the path of the new kernel,
+    named e.g. de440s-2025-2030.bsp in DATA_DIR, which can then be used
+    with set_kernel() or ASTRO_EVENTS_KERNEL.
+    """
+    from jplephem.daf import DAF
+    from jplephem.excerpter import write_excerpt
+    from jplephem.spk import SPK
+
+    source = source or KERNEL
+    source_path = get_loader().path_to(source)
+    if not os.path.exists(source_path):
+        get_loader()(source)  # Download the full kernel first
+    if output is None:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        output = os.path.join(DATA_DIR, f"{stem}-{start_year}-{end_year}.bsp")
+
+    ts = get_timescale()
+    start_jd = ts.utc(start_year, 1, 1).tdb - 1
+    end_jd = ts.utc(end_year + 1, 1, 1).tdb + 1
+    with open(source_path, "rb") as f:
+        spk = SPK(DAF(f))
+        summaries = [
+            summary for summary, segment in zip(spk.daf.summaries(), spk.segments)
+            if segment.target in REQUIRED_TARGETS
+        ]
+        with open(output, "w+b") as output_file:
+            write_excerpt(spk, output_file, start_jd, end_jd, summaries)
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a date-span truncated copy of the ephemeris kernel.")
+    parser.add_argument("start_year", type=int, help="First year to cover")
+    parser.add_argument("end_year", type=int, help="Last year to cover")
+    parser.add_argument("--source", help=f"Kernel to truncate (default: {KERNEL})")
+    parser.add_argument("--output", help="Output path (default: <kernel>-<start>-<end>.bsp)")
+    args = parser.parse_args()
+    path = truncate_kernel(args.start_year, args.end_year, output=args.output, source=args.source)
+    print(f"Wrote {path}; use it with ASTRO_EVENTS_KERNEL={os.path.basename(path)}")
@@ -0,0 +1,251 @@
+import numpy as np
+from skyfield.api import wgs84
+
+# Low-precision analytic positions for the Sun, Moon and planets, after
+# Paul Schlyter's "How to compute planetary positions": mean orbital
+# elements of date plus the largest perturbation terms. No kernel file is
+# needed and every function is vectorized over an array of times.
+#
+# Orbital elements: N (ascending node), i (inclination), w (argument of
+# perihelion), a (semi-major axis, AU; Earth radii for the Moon), e and
+# M (mean anomaly), each as (value at d = 0, change per day), in degrees.
+orbital_elements = {
+    "Moon": ((125.1228, -0.0529538083), (5.1454, 0.0), (318.0634, 0.1643573223),
+             (60.2666, 0.0), (0.054900, 0.0), (115.3654, 13.0649929509)),
+    "Mercury": ((48.3313, 3.24587e-5), (7.0047, 5.00e-8), (29.1241, 1.01444e-5),
+                (0.387098, 0.0), (0.205635, 5.59e-10), (168.6562, 4.0923344368)),
+    "Venus": ((76.6799, 2.46590e-5), (3.3946, 2.75e-8), (54.8910, 1.38374e-5),
+              (0.723330, 0.0), (0.006773, -1.302e-9), (48.0052, 1.6021302244)),
+    "Mars": ((49.5574, 2.11081e-5), (1.8497, -1.78e-8), (286.5016, 2.92961e-5),
+             (1.523688, 0.0), (0.093405, 2.516e-9), (18.6021, 0.5240207766)),
+    "Jupiter": ((100.4542, 2.76854e-5), (1.3030, -1.557e-7), (273.8777, 1.64505e-5),
+                (5.20256, 0.0), (0.048498, 4.469e-9), (19.8950, 0.0830853001)),
+    "Saturn": ((113.6634, 2.38980e-5), (2.4886, -1.081e-7), (339.3939, 2.97661e-5),
+               (9.55475, 0.0), (0.055546, -9.499e-9), (316.9670, 0.0334442282)),
+    "Uranus": ((74.0005, 1.3978e-5), (0.7733, 1.9e-8), (96.6612, 3.0565e-5),
+               (19.18171, -1.55e-8), (0.047318, 7.45e-9), (142.5905, 0.011725806)),
+    "Neptune": ((131.7806, 3.0173e-5), (1.7700, -2.55e-7), (272.8461, -6.027e-6),
+                (30.05826, 3.313e-8), (0.008606, 2.15e-9), (260.2471, 0.005995147)),
+}
+
+fast_bodies = ("Sun", "Moon") + tuple(name for name in orbital_elements if name != "Moon")
+
+EARTH_RADIUS_AU = 6378.14 / 149597870.7
+LIGHT_TIME_DAYS_PER_AU = 0.0057755183
+
+
+def _day_number(tt):
+    """Days since 2000 Jan 0.0 TT, the epoch of the elements."""
+    return np.asarray(tt, dtype=float) - 2451543.5
+
+
+def _element(value, d):
+    return value[0] + value[1] * d
+
+
+def _sun_elements(d):
+    """Return the Sun's (argument of perihelion, eccentricity, mean anomaly) in degrees."""
+    return 282.9404 + 4.70935e-5 * d, 0.016709 - 1.151e-9 * d, 356.0470 + 0.9856002585 * d
+
+
+def _kepler(M, e):
+    """Return (true anomaly in degrees, radius in units of a) for mean anomaly M in degrees."""
+    M = np.radians(M)
+    E = M + e * np.sin(M) * (1.0 + e * np.cos(M))
+    for _ in range(5):
+        E = E - (E - e * np.sin(E) - M) / (1.0 - e * np.cos(E))
+    x, y = np.cos(E) - e, np.sqrt(1.0 - e * e) * np.sin(E)
+    return np.degrees(np.arctan2(y, x)), np.hypot(x, y)
+
+
+def _orbit_xyz(name, d):
+    """Ecliptic-of-date xyz of a body in its orbit (heliocentric AU, or geocentric Earth radii for the Moon)."""
+    N, i, w, a, e, M = (_element(value, d) for value in orbital_elements[name])
+    v, r = _kepler(M, e)
+    r = r * a
+    N, i, vw = np.radians(N), np.radians(i), np.radians(v + w)
+    return r * np.array([
+        np.cos(N) * np.cos(vw) - np.sin(N) * np.sin(vw) * np.cos(i),
+        np.sin(N) * np.cos(vw) + np.cos(N) * np.sin(vw) * np.cos(i),
+        np.sin(vw) * np.sin(i),
+    ])
+
+
+def _spherical(xyz):
+    lon = np.degrees(np.arctan2(xyz[1], xyz[0]))
+    r = np.sqrt((xyz ** 2).sum(axis=0))
+    return lon, np.degrees(np.arcsin(xyz[2] / r)), r
+
+
+def _cartesian(lon, lat, r):
+    lon, lat = np.broadcast_arrays(np.radians(lon), np.radians(lat))
+    return r * np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _sun_xyz(d):
+    """Geocentric ecliptic-of-date xyz of the Sun in AU."""
+    w, e, M = _sun_elements(d)
+    v, r = _kepler(M, e)
+    return _cartesian(v + w, 0.0, r)
+
+
+def _moon_xyz(d):
+    """Geocentric ecliptic-of-date xyz of the Moon in AU, with the main perturbations."""
+    lon, lat, r = _spherical(_orbit_xyz("Moon", d))
+    ws, _, Ms = _sun_elements(d)
+    N, _, w, _, _, M = (_element(value, d) for value in orbital_elements["Moon"])
+    Lm = N + w + M
+    D = np.radians(Lm - (Ms + ws))
+    F = np.radians(Lm - N)
+    M, Ms = np.radians(M), np.radians(Ms)
+
+    lon = lon + (
+        -1.274 * np.sin(M - 2 * D) + 0.658 * np.sin(2 * D) - 0.186 * np.sin(Ms)
+        - 0.059 * np.sin(2 * M - 2 * D) - 0.057 * np.sin(M - 2 * D + Ms) + 0.053 * np.sin(M + 2 * D)
+        + 0.046 * np.sin(2 * D - Ms) + 0.041 * np.sin(M - Ms) - 0.035 * np.sin(D)
+        - 0.031 * np.sin(M + Ms) - 0.015 * np.sin(2 * F - 2 * D) + 0.011 * np.sin(M - 4 * D)
+    )
+    lat = lat + (
+        -0.173 * np.sin(F - 2 * D) - 0.055 * np.sin(M - F - 2 * D) - 0.046 * np.sin(M + F - 2 * D)
+        + 0.033 * np.sin(F + 2 * D) + 0.017 * np.sin(2 * M + F)
+    )
+    r = r - 0.58 * np.cos(M - 2 * D) - 0.46 * np.cos(2 * D)
+    return _cartesian(lon, lat, r * EARTH_RADIUS_AU)
+
+
+def _planet_xyz(name, d):
+    """Heliocentric ecliptic-of-date xyz of a planet in AU, with the Jupiter/Saturn/Uranus perturbations."""
+    xyz = _orbit_xyz(name, d)
+    if name not in ("Jupiter", "Saturn", "Uranus"):
+        return xyz
+
+    Mj = np.radians(_element(orbital_elements["Jupiter"][5], d))
+    Ms = np.radians(_element(orbital_elements["Saturn"][5], d))
+    Mu = np.radians(_element(orbital_elements["Uranus"][5], d))
+    deg = np.radians
+    lon, lat, r = _spherical(xyz)
+    if name == "Jupiter":
+        lon = lon + (
+            -0.332 * np.sin(2 * Mj - 5 * Ms - deg(67.6)) - 0.056 * np.sin(2 * Mj - 2 * Ms + deg(21))
+            + 0.042 * np.sin(3 * Mj - 5 * Ms + deg(21)) - 0.036 * np.sin(Mj - 2 * Ms)
+            + 0.022 * np.cos(Mj - Ms) + 0.023 * np.sin(2 * Mj - 3 * Ms + deg(52))
+            - 0.016 * np.sin(Mj - 5 * Ms - deg(69))
+        )
+    elif name == "Saturn":
+        lon = lon + (
+            0.812 * np.sin(2 * Mj - 5 * Ms - deg(67.6)) - 0.229 * np.cos(2 * Mj - 4 * Ms - deg(2))
+            + 0.119 * np.sin(Mj - 2 * Ms - deg(3)) + 0.046 * np.sin(2 * Mj - 6 * Ms - deg(69))
+            + 0.014 * np.sin(Mj - 3 * Ms + deg(32))
+        )
+        lat = lat - 0.020 * np.cos(2 * Mj - 4 * Ms - deg(2)) + 0.018 * np.sin(2 * Mj - 6 * Ms - deg(49))
+    else:
+        lon = lon + (
+            0.040 * np.sin(Ms - 2 * Mu + deg(6)) + 0.035 * np.sin(Ms - 3 * Mu + deg(33))
+            - 0.015 * np.sin(Mj - Mu + deg(20))
+        )
+    return _cartesian(lon, lat, r)
+
+
+def geocentric_xyz(name, tt):
+    """Return the geocentric equator-of-date xyz (AU) of a body at TT Julian dates, shape (3 x times)."""
+    d = _day_number(tt)
+    if name == "Sun":
+        xyz = _sun_xyz(d)
+    elif name == "Moon":
+        xyz = _moon_xyz(d)
+    else:
+        sun = _sun_xyz(d)
+        xyz = _planet_xyz(name, d) + sun
+        # One light-time correction: the planet where it was when the light left it
+        delay = np.sqrt((xyz ** 2).sum(axis=0)) * LIGHT_TIME_DAYS_PER_AU
+        xyz = _planet_xyz(name, d - delay) + sun
+
+    # Ecliptic of date to equator of date
+    obliquity = np.radians(23.4393 - 3.563e-7 * d)
+    x, y, z = xyz
+    return np.array([x, y * np.cos(obliquity) - z * np.sin(obliquity), y * np.sin(obliquity) + z * np.cos(obliquity)])
+
+
+def moon_phase_angle(tt):
+    """Return the Moon's phase angle in degrees at TT Julian dates: its ecliptic longitude east of the Sun's."""
+    d = _day_number(tt)
+    sun, moon = _sun_xyz(d), _moon_xyz(d)
+    return np.degrees(np.arctan2(moon[1], moon[0]) - np.arctan2(sun[1], sun[0])) % 360.0
+
+
+def observer_position(lat, lon, theta, elevation_m=0.0, itrs_xyz=None):
+    """Return the observer's geocentric (3 x times) vector in AU in the equator of date.
+
+    theta is the Greenwich sidereal angle in radians at each time; itrs_xyz
+    is the observer's ITRS position in AU when already known, such as
+    ObserverContext.itrs_xyz.
+    """
+    x, y, z = wgs84.latlon(lat, lon, elevation_m).itrs_xyz.au if itrs_xyz is None else itrs_xyz
+    return np.array([x * np.cos(theta) - y * np.sin(theta), x * np.sin(theta) + y * np.cos(theta), np.full_like(theta, z)])
+
+
+def horizon_coordinates(geocentric, lat, lon, theta, elevation_m=0.0, itrs_xyz=None):
+    """Convert geocentric equator-of-date vectors to topocentric (alt, az, distance).
+
+    geocentric is (bodies x 3 x times) in AU and theta the Greenwich
+    sidereal angle in radians at each time. The observer's position is
+    subtracted (parallax) and the geodetic latitude defines the horizon.
+    Angles are returned in degrees; no refraction is applied. itrs_xyz
+    is passed to observer_position.
+    """
+    v = geocentric - observer_position(lat, lon, theta, elevation_m, itrs_xyz)
+    distance = np.sqrt((v ** 2).sum(axis=1))
+    ra = np.arctan2(v[:, 1], v[:, 0])
+    dec = np.arcsin(v[:, 2] / distance)
+    hour_angle = theta + np.radians(lon) - ra
+
+    phi = np.radians(lat)
+    alt = np.arcsin(np.sin(phi) * np.sin(dec) + np.cos(phi) * np.cos(dec) * np.cos(hour_angle))
+    az = np.arctan2(-np.cos(dec) * np.sin(hour_angle), np.sin(dec) * np.cos(phi) - np.cos(dec) * np.cos(hour_angle) * np.sin(phi))
+    return np.degrees(alt), np.degrees(az) % 360.0, distance
+
+
+def fast_altaz(names, lat, lon, t, elevation_m=0.0, itrs_xyz=None):
+    """Return (alt, az, distance) arrays of shape (bodies x times) from the analytic series.
+
+    names are entries of fast_bodies and t a Skyfield Time, single or array.
+    Accuracy is at the arcminute level; see check_accuracy().
+    """
+    t = t if t.shape else t.ts.tt_jd(np.atleast_1d(t.tt))
+    geocentric = np.array([geocentric_xyz(name, t.tt) for name in names])
+    theta = np.radians(t.gmst * 15.0)
+    return horizon_coordinates(geocentric, lat, lon, theta, elevation_m, itrs_xyz)
+
+
+def check_accuracy(eph, lat, lon, t):
+    """Return {body: max angular error in arcminutes} of fast_altaz against Skyfield and eph."""
+    from current_planet_position import snapshot_bodies
+    kernel_keys = {"Moon": "moon", **snapshot_bodies}
+    observer = eph["earth"] + wgs84.latlon(lat, lon)
+    alt, az, _ = fast_altaz(fast_bodies, lat, lon, t)
+    errors = {}
+    for i, name in enumerate(fast_bodies):
+        ref_alt, ref_az, _ = observer.at(t).observe(eph[kernel_keys[name]]).apparent().altaz()
+        a1, a2 = np.radians(alt[i]), ref_alt.radians
+        cos_sep = np.sin(a1) * np.sin(a2) + np.cos(a1) * np.cos(a2) * np.cos(np.radians(az[i]) - ref_az.radians)
+        errors[name] = float(np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0))).max() * 60)
+    return errors
+
+
+if __name__ == "__main__":
+    import argparse
+    from ephemeris import get_ephemeris, get_timescale
+
+    parser = argparse.ArgumentParser(description="Compare the low-precision analytic positions with Skyfield.")
+    parser.add_argument("start_year", type=int)
+    parser.add_argument("end_year", type=int)
+    parser.add_argument("--lat", type=float, default=39.10)
+    parser.add_argument("--lon", type=float, default=-84.51)
+    parser.add_argument("--samples", type=int, default=20000, help="Random sample times (default: 20000)")
+    args = parser.parse_args()
+
+    ts = get_timescale()
+    first, last = ts.utc(args.start_year, 1, 1).tt, ts.utc(args.end_year + 1, 1, 1).tt
+    tt = np.sort(np.random.default_rng(0).uniform(first, last, args.samples))
+    for name, error in check_accuracy(get_ephemeris(), args.lat, args.lon, ts.tt_jd(tt)).items():
+        print(f"{name:<8} max error: {error:5.2f}'")
@@ -0,0 +1,61 @@
+import json
+import os
+
+import metrics
+import sqlite_cache
+
+# Per-night forecast results, kept next to the location cache. Forecasts for
+# the same place are rerun daily with a horizon that moves by one night, so
+# only the new night at the end needs computing.
+CACHE_DIR = sqlite_cache.DEFAULT_CACHE_DIR
+CACHE_TTL_DAYS = 30
+CACHE_MAX_ENTRIES = 100000
+
+_columns = ("result TEXT",)
+
+
+def location_key(lat, lon):
+    """Round a location to about 100 m, far below anything that moves a result by a second."""
+    return f"{lat:.3f},{lon:.3f}"
+
+
+def night_key(query, lat, lon, day, params):
+    """Return the cache key of one night: query, rounded location, date and every parameter."""
+    options = ",".join(f"{name}={params[name]}" for name in sorted(params))
+    return f"{query}|{location_key(lat, lon)}|{day.isoformat()}|{options}"
+
+
+def _path():
+    return os.path.join(CACHE_DIR, "forecasts.sqlite")
+
+
+def _read(keys):
+    rows = sqlite_cache.read(_path(), "nights", _columns, keys, CACHE_TTL_DAYS)
+    return {key: json.loads(result) for key, (result,) in rows.items()}
+
+
+def _write(results):
+    rows = {key: (json.dumps(result, separators=(",", ":")),) for key, result in results.items()}
+    sqlite_cache.write(_path(), "nights", _columns, rows, CACHE_TTL_DAYS, CACHE_MAX_ENTRIES)
+
+
+def cached_nights(query, lat, lon, dates, params, compute):
+    """Return {date: result} for every date, computing only the nights not in the cache.
+
+    compute(missing_dates) must return {date: result} with JSON-ready
+    results for exactly those dates; they are stored before returning.
+    params holds everything besides the location and date that the
+    results depend on (target, threshold, step, kernel, timezone, ...).
+    """
+    keys = {day: night_key(query, lat, lon, day, params) for day in dates}
+    cached = _read(list(keys.values())) if keys else {}
+    nights = {day: cached[key] for day, key in keys.items() if key in cached}
+
+    missing = [day for day in dates if day not in nights]
+    metrics.count("forecast_cache_hits", len(nights))
+    metrics.count("forecast_cache_misses", len(missing))
+    if missing:
+        computed = compute(missing)
+        _write({keys[day]: computed[day] for day in missing})
+        nights.update(computed)
+    return nights
@@ -0,0 +1,173 @@
+import argparse
+import os
+
+import numpy as np
+from skyfield.api import wgs84
+from skyfield.framelib import true_equator_and_equinox_of_date
+from skyfield.nutationlib import iau2000b_radians
+from skyfield.relativity import _compute_deflection, rmasses
+
+from ephemeris import DATA_DIR, get_ephemeris, get_timescale
+from fast_ephemeris import horizon_coordinates, observer_position
+from planet_viewer import planet_map
+import metrics
+
+# Tabulated bodies: display name -> kernel key
+table_bodies = {"Sun": "sun", "Moon": "moon", **planet_map}
+
+# Tables used by precision="tables"; override with ASTRO_EVENTS_TABLES or set_tables()
+TABLES = os.environ.get("ASTRO_EVENTS_TABLES")
+
+_tables = None
+
+
+def build_tables(start_year, end_year, step_hours=1.0, output=None):
+    """Tabulate apparent geocentric positions of table_bodies and save them as .npz.
+
+    Positions are Cartesian vectors in AU in the true equator and equinox
+    of date, sampled every step_hours from the start of start_year to the
+    end of end_year, stored as float32. Returns the output path.
+
+    The deflection of light by the Sun is left out: it grows sharply for
+    bodies passing behind or close to the Sun, faster than a few hours'
+    step can follow, so interpolate_geocentric adds it back afterwards.
+    """
+    ts = get_timescale()
+    eph = get_ephemeris()
+    earth = eph["earth"]
+    if output is None:
+        output = os.path.join(DATA_DIR, f"geocentric-{start_year}-{end_year}.npz")
+
+    step = step_hours / 24.0
+    tt0 = ts.utc(start_year, 1, 1).tt - 2 * step  # Margin for the interpolation stencil
+    tt1 = ts.utc(end_year + 1, 1, 1).tt + 3 * step
+    tt = tt0 + np.arange(int(np.ceil((tt1 - tt0) / step)) + 1) * step
+
+    xyz = np.empty((len(table_bodies), 3, len(tt)), dtype=np.float32)
+    for start in range(0, len(tt), 50000):
+        t = ts.tt_jd(tt[start:start + 50000])
+        earth_at = earth.at(t)
+        for i, key in enumerate(table_bodies.values()):
+            apparent = earth_at.observe(eph[key]).apparent(deflectors=(599, 699))
+            xyz[i, :, start:start + 50000] = apparent.frame_xyz(true_equator_and_equinox_of_date).au
+
+    np.savez(output, names=np.array(list(table_bodies)), tt0=tt0, step=step, xyz=xyz, sun_deflection=False)
+    return output
+
+
+def load_tables(path):
+    """Load tables written by build_tables as a dict of arrays."""
+    with np.load(path) as data:
+        # Older tables have the Sun's deflection built in
+        sun_deflection = bool(data["sun_deflection"]) if "sun_deflection" in data.files else True
+        return {"names": list(data["names"]), "tt0": float(data["tt0"]), "step": float(data["step"]), "xyz": data["xyz"],
+                "sun_deflection": sun_deflection}
+
+
+def set_tables(path):
+    """Use the tables in path for precision="tables"; they are loaded on the next get_tables() call."""
+    global TABLES, _tables
+    if path != TABLES:
+        TABLES, _tables = path, None
+
+
+def get_tables():
+    """Return the configured tables, loaded once per process."""
+    global _tables
+    if _tables is None:
+        if not TABLES:
+            raise ValueError("No geocentric tables configured: build them with geocentric_tables.py "
+                             "and set ASTRO_EVENTS_TABLES")
+        with metrics.span("load_tables"):
+            _tables = load_tables(TABLES)
+    return _tables
+
+
+def interpolate_geocentric(tables, tt, names=None, observer=0.0):
+    """Return (bodies x 3 x times) apparent geocentric vectors at TT Julian dates.
+
+    Uses 4-point Lagrange interpolation of the tables and then applies the
+    Sun's light deflection as seen from observer, a geocentric (3 x times)
+    vector in AU (default: the geocenter). names selects bodies (default:
+    all of them).
+    """
+    names = tables["names"] if names is None else list(names)
+    rows = [tables["names"].index(name) for name in names] + [tables["names"].index("Sun")]
+    xyz = tables["xyz"]
+    u = (np.atleast_1d(tt) - tables["tt0"]) / tables["step"]
+    i = np.floor(u).astype(int)
+    if (i < 1).any() or (i > xyz.shape[2] - 3).any():
+        raise ValueError("Requested times fall outside the precomputed tables")
+    f = u - i
+    weights = (
+        -f * (f - 1) * (f - 2) / 6,
+        (f + 1) * (f - 1) * (f - 2) / 2,
+        -(f + 1) * f * (f - 2) / 2,
+        (f + 1) * f * (f - 1) / 6,
+    )
+    geocentric = sum(w * xyz[:, :, i + k][rows].astype(float) for w, k in zip(weights, (-1, 0, 1, 2)))
+    if not tables["sun_deflection"]:
+        for body in geocentric[:-1]:
+            body += _compute_deflection(body - observer, observer - geocentric[-1], rmasses[10])
+    return geocentric[:-1]
+
+
+def topocentric_altaz(tables, lat, lon, t, elevation_m=0.0, names=None, itrs_xyz=None):
+    """Return (alt, az, distance) arrays of shape (bodies x times) for an observer.
+
+    Interpolates the geocentric tables, removes the observer's position
+    (parallax) after rotating it by Greenwich apparent sidereal time, and
+    converts to the local horizon using the geodetic latitude. Angles are
+    in degrees and distance in AU; no atmospheric refraction is applied.
+    names selects bodies and itrs_xyz is the observer's ITRS position in
+    AU when already known, such as ObserverContext.itrs_xyz.
+    """
+    t = t if t.shape else t.ts.tt_jd(np.atleast_1d(t.tt))
+    if itrs_xyz is None:
+        itrs_xyz = wgs84.latlon(lat, lon, elevation_m).itrs_xyz.au
+
+    # The observer rotates with the true equator of date by GAST
+    t._nutation_angles_radians = iau2000b_radians(t)
+    theta = np.radians(t.gast * 15.0)
+    geocentric = interpolate_geocentric(tables, t.tt, names, observer_position(lat, lon, theta, elevation_m, itrs_xyz))
+    return horizon_coordinates(geocentric, lat, lon, theta, elevation_m, itrs_xyz)
+
+
+def check_accuracy(tables, lat, lon, t):
+    """Return {body: max angular error in arcseconds} of topocentric_altaz against Skyfield."""
+    eph = get_ephemeris()
+    observer = eph["earth"] + wgs84.latlon(lat, lon)
+    alt, az, _ = topocentric_altaz(tables, lat, lon, t)
+    errors = {}
+    for i, name in enumerate(tables["names"]):
+        ref_alt, ref_az, _ = observer.at(t).observe(eph[table_bodies[name]]).apparent().altaz()
+        a1, a2 = np.radians(alt[i]), ref_alt.radians
+        cos_sep = np.sin(a1) * np.sin(a2) + np.cos(a1) * np.cos(a2) * np.cos(np.radians(az[i]) - ref_az.radians)
+        errors[name] = float(np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0))).max() * 3600)
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute geocentric ephemeris tables or check their accuracy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Tabulate positions for a range of years")
+    build.add_argument("start_year", type=int)
+    build.add_argument("end_year", type=int)
+    build.add_argument("--step", type=float, default=1.0, help="Table step in hours (default: 1)")
+    build.add_argument("--output", help="Output .npz path")
+    check = sub.add_parser("check", help="Compare interpolated positions with Skyfield")
+    check.add_argument("tables", help=".npz file written by build")
+    check.add_argument("--lat", type=float, default=39.10)
+    check.add_argument("--lon", type=float, default=-84.51)
+    check.add_argument("--samples", type=int, default=20000, help="Random sample times (default: 20000)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"Wrote {build_tables(args.start_year, args.end_year, args.step, args.output)}")
+    else:
+        tables = load_tables(args.tables)
+        first = tables["tt0"] + 2 * tables["step"]
+        last = tables["tt0"] + (tables["xyz"].shape[2] - 4) * tables["step"]
+        tt = np.sort(np.random.default_rng(0).uniform(first, last, args.samples))
+        for name, error in check_accuracy(tables, args.lat, args.lon, get_timescale().tt_jd(tt)).items():
+            print(f"{name:<8} max error: {error:6.2f}\"")
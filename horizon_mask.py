@@ -0,0 +1,66 @@
+import hashlib
+
+import numpy as np
+
+# A horizon mask is the altitude of the local skyline (trees, buildings,
+# terrain) against azimuth, precomputed into a table of altitudes at a fixed
+# step of azimuth. Visibility checks take one wherever they take a flat
+# altitude threshold; masking a whole (objects x times) array is then a
+# single interpolation in the table.
+
+
+def mask_from_points(azimuths, altitudes, resolution=0.5):
+    """Return the mask table of a skyline given as azimuth/altitude points in degrees.
+
+    The points are joined by straight lines, wrapping around north. The
+    table holds float32 altitudes at 0, resolution, 2 * resolution, ...
+    up to and including 360 degrees of azimuth.
+    """
+    azimuths = np.asarray(azimuths, dtype=float) % 360.0
+    order = np.argsort(azimuths)
+    grid = np.linspace(0.0, 360.0, int(round(360.0 / resolution)) + 1)
+    return np.interp(grid, azimuths[order], np.asarray(altitudes, dtype=float)[order], period=360.0).astype(np.float32)
+
+
+def load_mask(path, resolution=0.5):
+    """Load a skyline file and return its mask table.
+
+    The file holds one "azimuth altitude" pair in degrees per line,
+    separated by whitespace or a comma. Blank lines and # comments are skipped.
+    """
+    points = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("#")[0].replace(",", " ").split()
+            if fields:
+                points.append((float(fields[0]), float(fields[1])))
+    if not points:
+        raise ValueError(f"No azimuth/altitude points in {path}")
+    azimuths, altitudes = np.array(points).T
+    return mask_from_points(azimuths, altitudes, resolution)
+
+
+def mask_altitude(mask, azimuth):
+    """Return the skyline altitude in degrees at azimuths of any shape, interpolated in a mask table."""
+    steps = len(mask) - 1
+    x = (np.asarray(azimuth, dtype=float) % 360.0) * (steps / 360.0)
+    i = np.minimum(x.astype(int), steps - 1)
+    f = x - i
+    return mask[i] * (1.0 - f) + mask[i + 1] * f
+
+
+def is_mask(threshold):
+    """Whether a visibility threshold is a mask table rather than a flat altitude in degrees."""
+    return np.ndim(threshold) > 0
+
+
+def minimum_altitude(threshold, azimuth):
+    """Return the altitude a body at azimuth must clear: the flat threshold, or the mask's skyline there."""
+    return mask_altitude(threshold, azimuth) if is_mask(threshold) else threshold
+
+
+def threshold_key(threshold):
+    """Return a flat threshold as is, or a short digest of a mask table, e.g. for cache keys."""
+    if not is_mask(threshold):
+        return threshold
+    return "mask-" + hashlib.sha1(np.asarray(threshold, dtype=np.float32).tobytes()).hexdigest()[:16]
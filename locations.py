@@ -0,0 +1,114 @@
+import os
+from collections import OrderedDict
+
+import metrics
+import sqlite_cache
+
+# On-disk cache settings; the directory can be moved with ASTRO_EVENTS_CACHE_DIR
+CACHE_DIR = sqlite_cache.DEFAULT_CACHE_DIR
+CACHE_TTL_DAYS = 90
+CACHE_MAX_ENTRIES = 10000
+MEMORY_CACHE_SIZE = 256
+
+_columns = ("latitude REAL", "longitude REAL", "timezone TEXT", "address TEXT")
+
+_geocoder = None
+_timezone_finder = None
+_memory_cache = OrderedDict()
+
+
+def normalize_city(city_name):
+    """Return the cache key for a city name: case-folded with collapsed whitespace."""
+    return " ".join(city_name.casefold().split())
+
+
+def set_geocoder(geocoder):
+    """Replace the geocoding backend, e.g. with a local stand-in for tests.
+
+    The backend needs a geopy-style geocode(query) method returning an
+    object with latitude, longitude and address attributes, or None.
+    """
+    global _geocoder
+    _geocoder = geocoder
+    _memory_cache.clear()
+
+
+def get_geocoder():
+    """Return the geocoding backend, creating the default Nominatim client on first use."""
+    global _geocoder
+    if _geocoder is None:
+        from geopy.geocoders import Nominatim
+        _geocoder = Nominatim(user_agent="astro_events")
+    return _geocoder
+
+
+def get_timezone_finder():
+    """Return the process-wide TimezoneFinder, constructed on first use."""
+    global _timezone_finder
+    if _timezone_finder is None:
+        with metrics.span("timezone_finder"):
+            from timezonefinder import TimezoneFinder
+            _timezone_finder = TimezoneFinder()
+    return _timezone_finder
+
+
+def timezone_at(lat, lon):
+    """Return the IANA timezone name at a latitude/longitude, or None."""
+    return get_timezone_finder().timezone_at(lat=lat, lng=lon)
+
+
+def _path():
+    return os.path.join(CACHE_DIR, "locations.sqlite")
+
+
+def _read_disk_cache(key):
+    row = sqlite_cache.read(_path(), "locations", _columns, [key], CACHE_TTL_DAYS).get(key)
+    if row is None:
+        return None
+    return dict(zip(("latitude", "longitude", "timezone", "address"), row))
+
+
+def _write_disk_cache(key, location):
+    row = (location["latitude"], location["longitude"], location["timezone"], location["address"])
+    sqlite_cache.write(_path(), "locations", _columns, {key: row}, CACHE_TTL_DAYS, CACHE_MAX_ENTRIES)
+
+
+def resolve_location(city_name, offline=False):
+    """Resolve a city name to a dict with latitude, longitude, timezone and address.
+
+    Lookups go through an in-process LRU, then the on-disk SQLite cache,
+    and only then the geocoding backend. With offline=True the backend is
+    never contacted and a cache miss raises ValueError.
+    """
+    with metrics.span("resolve_location"):
+        return _resolve_location(city_name, offline)
+
+
+def _resolve_location(city_name, offline):
+    key = normalize_city(city_name)
+    location = _memory_cache.get(key)
+    if location is not None:
+        _memory_cache.move_to_end(key)
+        return location
+
+    location = _read_disk_cache(key)
+    if location is None:
+        if offline:
+            raise ValueError(f"Location '{city_name}' is not in the cache (offline mode)")
+        metrics.count("geocoder_requests")
+        with metrics.span("geocode"):
+            result = get_geocoder().geocode(city_name)
+        if not result:
+            raise ValueError(f"Could not find location for city: {city_name}")
+        location = {
+            "latitude": result.latitude,
+            "longitude": result.longitude,
+            "timezone": timezone_at(result.latitude, result.longitude),
+            "address": result.address,
+        }
+        _write_disk_cache(key, location)
+
+    _memory_cache[key] = location
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return location
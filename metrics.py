@@ -0,0 +1,124 @@
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+# Instrumentation shared by the scripts. It is off unless enable() is
+# called (the --profile / --metrics-json / --cprofile options), and while
+# off span() and count() return immediately.
+enabled = False
+spans = {}
+counters = {}
+
+_disabled_span = nullcontext()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def reset():
+    spans.clear()
+    counters.clear()
+
+
+@contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        calls, total = spans.get(name, (0, 0.0))
+        spans[name] = (calls + 1, total + elapsed)
+
+
+def span(name):
+    """Context manager that adds the time spent inside it to the named span."""
+    if not enabled:
+        return _disabled_span
+    return _timed(name)
+
+
+def spanned(name, iterable):
+    """Yield the items of iterable, adding the time spent producing each one to the named span.
+
+    Lets a generator pipeline that computes and prints one item at a time
+    still report its compute and render phases separately.
+    """
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count(name, n=1):
+    """Add n to the named counter."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + int(n)
+
+
+def observed(times, bodies=1):
+    """Count ephemeris evaluations of bodies at an array (or scalar) Time."""
+    if enabled:
+        count("ephemeris_evaluations", bodies)
+        count("samples", bodies * (times.shape[0] if times.shape else 1))
+
+
+def snapshot():
+    """Return the spans and counters recorded so far as a JSON-ready dict."""
+    return {
+        "spans": {name: {"calls": calls, "total_ms": total * 1000} for name, (calls, total) in spans.items()},
+        "counters": dict(counters),
+    }
+
+
+def add_arguments(parser):
+    """Add the --profile, --metrics-json and --cprofile options to a script's parser."""
+    parser.add_argument("--profile", action="store_true", help="Print phase timings and counters to stderr")
+    parser.add_argument("--metrics-json", metavar="FILE", help="Write phase timings and counters as JSON to FILE")
+    parser.add_argument("--cprofile", metavar="FILE", help="Write a cProfile dump (pstats format) to FILE")
+
+
+def print_report(report, file=sys.stderr):
+    print(f"\n{'Phase':<20} {'Calls':>6} {'ms':>10}", file=file)
+    for name, span_report in report["spans"].items():
+        print(f"{name:<20} {span_report['calls']:>6} {span_report['total_ms']:>10.1f}", file=file)
+    for name, value in report["counters"].items():
+        print(f"{name:<20} {value:>17}", file=file)
+
+
+@contextmanager
+def session(args):
+    """Instrument the body of a script's main() according to its parsed arguments.
+
+    Does nothing unless one of the options from add_arguments() was given.
+    """
+    if not (args.profile or args.metrics_json or args.cprofile):
+        yield
+        return
+
+    enable()
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span("total"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        report = snapshot()
+        if args.profile:
+            print_report(report)
+        if args.metrics_json:
+            with open(args.metrics_json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,183 @@
+import argparse
+from datetime import datetime, timedelta, time
+
+import numpy as np
+from skyfield import almanac
+from skyfield.nutationlib import iau2000b_radians
+
+from ephemeris import get_timescale
+from observer_context import observer_for_city
+from twilight import to_local
+from windows import altitude_windows, interpolated_altitudes, intersect_intervals, refine_roots
+import metrics
+import output
+
+# Names of the eighths of a lunation, each centred on its phase angle
+phase_names = [
+    "New Moon", "Waxing Crescent", "First Quarter", "Waxing Gibbous",
+    "Full Moon", "Waning Gibbous", "Last Quarter", "Waning Crescent",
+]
+quarter_names = phase_names[::2]
+quarter_symbols = ["🌑", "🌓", "🌕", "🌗"]
+
+# Altitude of the Moon's center at moonrise and moonset: the refracted
+# horizon, as in Skyfield's risings_and_settings
+MOON_HORIZON = -34 / 60
+
+
+def phase_name(angle):
+    """Return the name of a Moon phase angle in degrees (0 new, 90 first quarter, 180 full)."""
+    return phase_names[int(np.floor(angle / 45.0 + 0.5)) % 8]
+
+
+def phase_angle(eph, t):
+    """Return the Moon's phase angle in degrees at a Time: its ecliptic longitude east of the Sun's.
+
+    With eph=None the analytic Sun and Moon from fast_ephemeris are used.
+    """
+    metrics.observed(t, 2)
+    if eph is None:
+        from fast_ephemeris import moon_phase_angle
+        return moon_phase_angle(t.tt)
+    # The truncated IAU 2000B nutation moves the angle by far less than an arcsecond
+    t._nutation_angles_radians = iau2000b_radians(t)
+    return almanac.moon_phase(eph, t).degrees
+
+
+def lunar_calendar(eph, ts, topos, timezone, start_date, days=1):
+    """Return the Moon's phase, illumination, rise and set for each night of a date range.
+
+    Nights run from local noon to local noon as in twilight.find_twilight.
+    The result is a dict of arrays, one entry per night, with times as TT
+    Julian dates (NaN where the event does not happen that night):
+
+    - "dates", "start", "end": as in find_twilight
+    - "midnight": TT of the local midnight ending the night's date
+    - "phase_angle", "illumination": at that midnight (degrees, fraction lit)
+    - "moonrise" / "moonset": the first of each during the night
+    - "quarter" / "quarter_time": index into quarter_names and TT of a
+      new, first quarter, full or last quarter Moon during the night (-1, NaN if none)
+    - "moon_up": (n x 2) array of TT intervals with the Moon above the horizon, over the whole range
+
+    The quarters are bracketed from the phase angle at every local noon
+    and refined together, the rises and sets come from one solve of the
+    Moon's altitude, and the phases from one evaluation at every midnight.
+    """
+    dates = [start_date + timedelta(days=i) for i in range(days + 1)]
+    noons = ts.from_datetimes([timezone.localize(datetime.combine(d, time(12))) for d in dates])
+    midnights = ts.from_datetimes([timezone.localize(datetime.combine(d, time())) for d in dates[1:]])
+    edges = noons.tt
+
+    result = {"dates": dates[:-1], "start": edges[:-1], "end": edges[1:], "midnight": midnights.tt}
+    result["phase_angle"] = phase_angle(eph, midnights)
+    result["illumination"] = almanac.fraction_illuminated(eph, "moon", midnights)
+
+    def first_of_night(tt):
+        values = np.full(days, np.nan)
+        nights = np.searchsorted(edges, tt, side="right") - 1
+        values[nights[::-1]] = tt[::-1]  # Assigned last to first, so the first of a night wins
+        return values
+
+    # Moon directions every half hour, interpolated: within 5" of the exact altitude and 2 s in rise and set times
+    altitude_at = interpolated_altitudes(eph, topos, [eph["moon"]], ts, edges[0], edges[-1], 1 / 48)
+    up = altitude_windows(altitude_at, ts, edges[0], edges[-1], MOON_HORIZON)[0]["intervals"]
+    result["moonrise"] = first_of_night(up[:, 0][up[:, 0] > edges[0]])
+    result["moonset"] = first_of_night(up[:, 1][up[:, 1] < edges[-1]])
+    result["moon_up"] = up
+
+    # A quarter falls in each night whose noons straddle a multiple of 90°, at most one
+    # since they are a week apart; refine the angle's distance from it to zero
+    quarter = np.floor(phase_angle(eph, noons) / 90.0).astype(int)
+    nights = np.flatnonzero(quarter[1:] != quarter[:-1])
+    target = quarter[nights + 1] * 90.0
+
+    def past_quarter(x):
+        return (phase_angle(eph, ts.tt_jd(x)) - target + 180.0) % 360.0 - 180.0
+
+    times = np.zeros(0)
+    if len(nights):
+        a, b = edges[nights], edges[nights + 1]
+        times = refine_roots(past_quarter, a, b, past_quarter(a), past_quarter(b), 1 / 86400)
+    result["quarter_time"] = np.full(days, np.nan)
+    result["quarter_time"][nights] = times
+    result["quarter"] = np.full(days, -1)
+    result["quarter"][nights] = quarter[nights + 1] % 4
+    return result
+
+
+def moon_up_fraction(calendar, tt0, tt1):
+    """Return the fraction of the span between TT Julian dates tt0 and tt1 with the Moon above the horizon."""
+    if not tt1 > tt0:
+        return 0.0
+    overlap = intersect_intervals(calendar["moon_up"], [(tt0, tt1)])
+    return float((overlap[:, 1] - overlap[:, 0]).sum() / (tt1 - tt0))
+
+
+# Output rows for --format: one per night
+def calendar_rows(calendar, ts, timezone):
+    for i, day in enumerate(calendar["dates"]):
+        quarter = calendar["quarter"][i]
+        yield {
+            "date": day,
+            "phase": phase_name(calendar["phase_angle"][i]),
+            "phase_angle": calendar["phase_angle"][i],
+            "illumination": calendar["illumination"][i],
+            "moonrise": to_local(ts, calendar["moonrise"][i], timezone),
+            "moonset": to_local(ts, calendar["moonset"][i], timezone),
+            "quarter": quarter_names[quarter] if quarter >= 0 else None,
+            "quarter_time": to_local(ts, calendar["quarter_time"][i], timezone),
+        }
+
+calendar_fields = ("date", "phase", "phase_angle", "illumination", "moonrise", "moonset", "quarter", "quarter_time")
+
+
+def _clock(day, value):
+    """Format a local time as HH:MM, marked +1 when it falls on the next day."""
+    if value is None:
+        return f"{'--':<8}"
+    return f"{value:%H:%M}{' +1' if value.date() > day else '   '}"
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Moon phases, illumination, moonrise and moonset for each night.")
+    parser.add_argument("city", help="City name (e.g. 'Cincinnati')")
+    parser.add_argument("--start", help="First night as YYYY-MM-DD (default: today)")
+    parser.add_argument("--days", type=int, default=30, help="Number of nights (default: 30)")
+    parser.add_argument("--offline", action="store_true", help="Resolve the city from the local cache only")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.session(args):
+        try:
+            observer = observer_for_city(args.city, offline=args.offline)
+        except ValueError as e:
+            output.report_error(f"❌ Error: {e}", args.format)
+            return
+        timezone = observer.timezone
+        start = datetime.fromisoformat(args.start).date() if args.start else observer.today()
+
+        ts = get_timescale()
+        with metrics.span("compute"):
+            calendar = observer.lunar_calendar(start, args.days)
+
+        if args.format != "text":
+            output.write_rows(calendar_rows(calendar, ts, timezone), args.format, calendar_fields)
+            return
+
+        with metrics.span("render"):
+            print(f"\n🌙 Moon calendar for {args.city} ({observer.latitude:.2f}, {observer.longitude:.2f}) "
+                  f"| Timezone: {timezone.zone}\n")
+            print(f"{'Date':<10} | {'Phase':<15} | Lit  | Moonrise | Moonset  | Quarter")
+            for row in calendar_rows(calendar, ts, timezone):
+                day = row["date"]
+                quarter = ""
+                if row["quarter"]:
+                    symbol = quarter_symbols[quarter_names.index(row["quarter"])]
+                    quarter = f"{symbol} {row['quarter']} at {_clock(day, row['quarter_time']).strip()}"
+                print(f"{day:%Y-%m-%d} | {row['phase']:<15} | {row['illumination']:4.0%} | "
+                      f"{_clock(day, row['moonrise'])} | {_clock(day, row['moonset'])} | {quarter}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+import pytz
+from skyfield.api import wgs84
+
+from ephemeris import get_ephemeris, get_timescale
+from locations import resolve_location
+from twilight import find_twilight, to_local
+import metrics
+
+# Everything that depends only on where the observer stands is built once per
+# site and shared by the scripts: the geodetic position and its ITRS vector,
+# the timezone, the earth + observer vector function, and per-night products
+# such as twilight times and the sample times of each dark evening.
+CONTEXT_CACHE_SIZE = 256
+MEMO_SIZE = 64
+
+_contexts = OrderedDict()
+
+
+class ObserverContext:
+    """An observing site and the per-night results computed for it so far.
+
+    latitude and longitude are in degrees and elevation in meters; topos
+    is the Skyfield wgs84 position and itrs_xyz its fixed ITRS vector in
+    AU; timezone is a pytz timezone. The methods memoize what they compute,
+    keeping the MEMO_SIZE most recently used results. The observer argument
+    of the scripts' functions is one of these.
+    """
+
+    def __init__(self, latitude, longitude, timezone, elevation=0.0):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.elevation = elevation
+        self.timezone = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+        self.topos = wgs84.latlon(latitude, longitude, elevation)
+        self.itrs_xyz = self.topos.itrs_xyz.au
+        self._vector = None
+        self._memo = OrderedDict()
+
+    @property
+    def vector(self):
+        """The earth + observer vector function, composed on first use as it needs the kernel."""
+        if self._vector is None:
+            self._vector = get_ephemeris()["earth"] + self.topos
+        return self._vector
+
+    def today(self):
+        """Return the current local date at the site."""
+        return datetime.now(self.timezone).date()
+
+    def _memoized(self, key, compute):
+        if key in self._memo:
+            return self._hit(key)
+        value = self._memo[key] = compute()
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return value
+
+    def _hit(self, key):
+        metrics.count("observer_memo_hits")
+        self._memo.move_to_end(key)
+        return self._memo[key]
+
+    def twilight(self, start_date, days=1, precision="high"):
+        """Return twilight.find_twilight for days nights from start_date.
+
+        A range inside one computed earlier is sliced out of it instead of
+        searched again. The lists and arrays returned are copies, so callers
+        may modify them. precision="low" uses the analytic Sun of fast_ephemeris.
+        """
+        covering = [
+            key for key in self._memo
+            if key[0] == "twilight" and key[3] == precision and key[1] <= start_date
+            and (start_date - key[1]).days + days <= key[2]
+        ]
+        if covering:
+            offset = (start_date - covering[0][1]).days
+            nights = self._hit(covering[0])
+        else:
+            def compute():
+                eph = get_ephemeris() if precision == "high" else None
+                return find_twilight(eph, get_timescale(), self.topos, self.timezone, start_date, days)
+
+            offset = 0
+            nights = self._memoized(("twilight", start_date, days, precision), compute)
+        return {name: values[offset:offset + days].copy() for name, values in nights.items()}
+
+    def evening_samples(self, day, step_minutes, precision="high"):
+        """Return a Time array every step_minutes from dark to 23:59 local on day, or None if no darkness before midnight.
+
+        Dark starts at sunset, or at local noon during polar night; None
+        is also returned on polar days.
+        """
+        def compute():
+            ts = get_timescale()
+            dark_start = self.twilight(day, 1, precision)["dark_start"][0]
+            sunset = to_local(ts, dark_start, self.timezone)
+            midnight = self.timezone.localize(datetime.combine(day, time(23, 59)))
+            if sunset is None or sunset >= midnight:
+                return None
+            sample_count = max(int((midnight - sunset) / timedelta(minutes=step_minutes)) + 1, 2)
+            return ts.linspace(ts.from_datetime(sunset), ts.from_datetime(midnight), sample_count)
+
+        return self._memoized(("evening", day, step_minutes, precision), compute)
+
+    def lunar_calendar(self, start_date, days=1):
+        """Return moon_calendar.lunar_calendar for days nights from start_date, as a copy of the memoized one."""
+        from moon_calendar import lunar_calendar
+
+        def compute():
+            return lunar_calendar(get_ephemeris(), get_timescale(), self.topos, self.timezone, start_date, days)
+
+        calendar = self._memoized(("moon", start_date, days), compute)
+        return {name: values.copy() for name, values in calendar.items()}
+
+
+def observer_for(latitude, longitude, timezone, elevation=0.0):
+    """Return the shared ObserverContext of a site, creating it on first use.
+
+    Contexts are kept for the CONTEXT_CACHE_SIZE most recently used sites,
+    so repeated queries for a site reuse its setup and memoized nights.
+    """
+    zone = timezone if isinstance(timezone, str) else timezone.zone
+    key = (latitude, longitude, zone, elevation)
+    context = _contexts.get(key)
+    if context is None:
+        context = _contexts[key] = ObserverContext(latitude, longitude, zone, elevation)
+        if len(_contexts) > CONTEXT_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    else:
+        _contexts.move_to_end(key)
+    return context
+
+
+def observer_for_city(city_name, offline=False):
+    """Resolve a city name as in locations.resolve_location and return its ObserverContext."""
+    location = resolve_location(city_name, offline=offline)
+    if not location["timezone"]:
+        raise ValueError(f"Could not determine timezone for '{city_name}'")
+    return observer_for(location["latitude"], location["longitude"], location["timezone"])
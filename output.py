@@ -0,0 +1,76 @@
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+import metrics
+
+# Output formats shared by the scripts: text is the emoji-decorated report
+# for people, jsonl and csv are one flat record per line for programs.
+formats = ("text", "jsonl", "csv")
+
+
+def add_arguments(parser):
+    """Add the --format option to a script's parser."""
+    parser.add_argument("--format", choices=formats, default="text",
+                        help="Output as a text report, JSON Lines or CSV (default: text)")
+
+
+def report_error(message, fmt):
+    """Print an error: in the text report on stdout, or on stderr with exit status 1 for jsonl and csv."""
+    if fmt == "text":
+        print(message)
+    else:
+        sys.exit(message)
+
+
+def json_default(value):
+    """json.dumps default= hook for datetimes and NumPy scalars."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _plain(value, timezone):
+    if isinstance(value, datetime) and timezone is not None:
+        value = value.astimezone(timezone)
+    if isinstance(value, (datetime, date, np.generic)):
+        return json_default(value)
+    return value
+
+
+def write_rows(rows, fmt, fields, timezone=None, file=None):
+    """Write dict rows as JSON Lines or CSV while they are being produced; return the row count.
+
+    rows can be any iterable, typically a generator, and is consumed one
+    row at a time. Datetimes are converted to timezone when one is given
+    and written as ISO 8601; each row is flushed so a reader downstream
+    sees it at once. fields orders the CSV columns.
+    """
+    file = file or sys.stdout
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+
+    count = 0
+    try:
+        for row in rows:
+            with metrics.span("render"):
+                row = {name: _plain(value, timezone) for name, value in row.items()}
+                if writer:
+                    writer.writerow(row)
+                else:
+                    file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                file.flush()
+            count += 1
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`): stop producing rows, and point
+        # the file at /dev/null so the flush at interpreter exit stays quiet
+        os.dup2(os.open(os.devnull, os.O_WRONLY), file.fileno())
+    return count
@@ -1,13 +1,20 @@
 import argparse
-from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
-from astral.sun import sun
-from astral.location import LocationInfo
-from skyfield.api import load, Topos
-from timezonefinder import TimezoneFinder
+import itertools
+from datetime import datetime, timedelta, time
 import pytz
-
-# Map display names to Skyfield barycenter keys (used in de440.bsp)
+import numpy as np
+from ephemeris import get_ephemeris, get_timescale
+import ephemeris
+import forecast_cache
+from horizon_mask import is_mask, load_mask, threshold_key
+from observer_context import observer_for_city
+from twilight import to_local
+from windows import altitude_windows, interpolated_altitudes, intersect_intervals
+from moon_calendar import phase_angle, phase_name
+import metrics
+import output
+
+# Map display names to Skyfield barycenter keys
 planet_map = {
     "Mercury": "Mercury BARYCENTER",
     "Venus": "Venus BARYCENTER",
@@ -18,178 +25,270 @@ planet_map = {
     "Neptune": "Neptune BARYCENTER"
 }
 
-# Return the current moon phase name for a given datetime
-def moon_phase(date):
-    epoch = datetime(2001, 1, 1, tzinfo=date.tzinfo)
-    diff = date - epoch
-    days = diff.days + (diff.seconds / 86400)
-    lunations = 0.20439731 + (days * 0.03386319269)
-    pos = lunations % 1
-    phases = [
-        "New Moon", "Waxing Crescent", "First Quarter", "Waxing Gibbous",
-        "Full Moon", "Waning Gibbous", "Last Quarter", "Waning Crescent"
-    ]
-    index = int((pos * 8) + 0.5) % 8
-    return phases[index]
-
-# Get latitude, longitude, and timezone from a city name
-def get_coordinates_and_timezone(city_name):
-    geolocator = Nominatim(user_agent="planet_viewer")
-    location = geolocator.geocode(city_name)
-    if not location:
-        raise ValueError(f"Could not find coordinates for city '{city_name}'")
-
-    tf = TimezoneFinder()
-    timezone = tf.timezone_at(lng=location.longitude, lat=location.latitude)
-    if not timezone:
-        raise ValueError(f"Could not determine timezone for '{city_name}'")
-
-    return location.latitude, location.longitude, timezone
-
-# Get planets visible tonight between sunset and sunrise
-def find_visible_planets(lat, lon, tz_str, date=None):
-    ts = load.timescale()
-    planets = load('de440.bsp')
-    earth = planets['earth']
-    observer = earth + Topos(latitude_degrees=lat, longitude_degrees=lon)
-    timezone = pytz.timezone(tz_str)
+# Return the moon phase name at a datetime, from the Sun and Moon positions
+def moon_phase(date, precision="high"):
+    ts = get_timescale()
+    eph = get_ephemeris() if precision == "high" else None
+    return phase_name(phase_angle(eph, ts.from_datetime(date)))
+
+# Function giving the altitudes in degrees of planet_map planets at an array
+# Time within [tt0, tt1], one row per planet, for windows.altitude_windows; with
+# a horizon mask as second argument, above its skyline.
+# precision="low" uses the analytic series in fast_ephemeris and no kernel.
+def planet_altitude_function(names, observer, ts, tt0, tt1, step_days, precision="high"):
+    if precision == "low":
+        from fast_ephemeris import fast_altaz
+        from horizon_mask import mask_altitude
+
+        def altitude_at(times, mask=None):
+            metrics.observed(times, len(names))
+            alt, az, _ = fast_altaz(names, observer.latitude, observer.longitude, times, itrs_xyz=observer.itrs_xyz)
+            return alt if mask is None else alt - mask_altitude(mask, az)
+
+        return altitude_at
+
+    planets = get_ephemeris()
+    return interpolated_altitudes(planets, observer.topos, [planets[planet_map[name]] for name in names], ts, tt0, tt1,
+                                  step_days)
+
+# Highest altitude over solved windows: at a transit inside them or at one of
+# their ends, given the altitudes at those ends (intervals.ravel())
+def window_peak(solved, end_altitudes):
+    peaks, intervals = solved["peaks"], solved["intervals"]
+    inside = ((peaks[:, None] >= intervals[:, 0]) & (peaks[:, None] <= intervals[:, 1])).any(axis=1)
+    times = np.concatenate([peaks[inside], intervals.ravel()])
+    alt = np.concatenate([solved["peak_altitudes"][inside], end_altitudes])
+    best = np.argmax(alt)
+    return alt[best], times[best]
+
+# Get planets visible tonight between sunset and sunrise. Rise-above and
+# set-below times are solved exactly; step_minutes only sets the bracketing grid.
+# threshold is the altitude to clear in degrees, or a horizon_mask table.
+def find_visible_planets(observer, date=None, step_minutes=60, precision="high", threshold=10.0):
+    ts = get_timescale()
+    timezone = observer.timezone
 
     now = datetime.now(timezone) if not date else date
 
-    # Get sunset/sunrise for the date
-    city = LocationInfo(latitude=lat, longitude=lon, timezone=tz_str)
-    s = sun(city.observer, date=now.date(), tzinfo=timezone)
-    sunset = s["sunset"]
-    sunrise = s["sunrise"] + timedelta(days=1)  # Next morning
-
-    # Prepare time intervals between sunset and sunrise
-    times = []
-    current_time = sunset
-    while current_time < sunrise:
-        times.append(ts.from_datetime(current_time))
-        current_time += timedelta(minutes=15)
+    # Get tonight's sunset and the next morning's sunrise
+    night = observer.twilight(now.date(), precision=precision)
+    if night["condition"][0] == "polar_day":
+        raise ValueError(f"The Sun does not set on {now.date()} at this location")
+    sunset = to_local(ts, night["dark_start"][0], timezone)
+    sunrise = to_local(ts, night["dark_end"][0], timezone)
+
+    # Solve every planet's windows above the threshold over the night in the same evaluations
+    names = list(planet_map)
+
+    tt0, tt1, step = night["dark_start"][0], night["dark_end"][0], step_minutes / 1440.0
+    altitude_at = planet_altitude_function(names, observer, ts, tt0, tt1, step, precision)
+    solved = altitude_windows(altitude_at, ts, tt0, tt1, threshold, step)
+    if is_mask(threshold):
+        # Transits were solved above the skyline: report their true altitudes
+        for row, s in enumerate(solved):
+            if len(s["peaks"]):
+                s["peak_altitudes"] = altitude_at(ts.tt_jd(s["peaks"]))[row]
+
+    # Altitudes at the ends of every window, all planets in one evaluation
+    ends = [s["intervals"].ravel() for s in solved]
+    splits = np.cumsum([len(e) for e in ends])[:-1]
+    all_ends = np.concatenate(ends)
+    end_altitudes = altitude_at(ts.tt_jd(all_ends)) if len(all_ends) else np.zeros((len(names), 0))
 
     visible_planets = []
-
-    # Check each planet's altitude over the night
-    for display_name, kernel_name in planet_map.items():
-        planet = planets[kernel_name]
-        max_alt = -90
-        best_time = None
-        first_visible = None
-        last_visible = None
-
-        for t in times:
-            alt, _, _ = observer.at(t).observe(planet).apparent().altaz()
-            alt_deg = alt.degrees
-            dt = t.utc_datetime().replace(tzinfo=pytz.UTC).astimezone(timezone)
-
-            if alt_deg > max_alt:
-                max_alt = alt_deg
-                best_time = dt
-
-            if alt_deg > 10:  # Visibility threshold
-                if first_visible is None:
-                    first_visible = dt
-                last_visible = dt
-
-        # Only include if visible at some point above 10°
-        if max_alt > 10 and first_visible and last_visible:
-            visible_planets.append((display_name, max_alt, best_time, first_visible, last_visible))
-
-    return visible_planets, sunset, sunrise, moon_phase(now)
-
-# Look ahead up to 120 days for when a specific planet is visible between sunset and midnight
-def find_next_visible_dates(lat, lon, tz_str, target_name):
-    ts = load.timescale()
-    planets = load('de440.bsp')
-    earth = planets['earth']
-    observer = earth + Topos(latitude_degrees=lat, longitude_degrees=lon)
-    timezone = pytz.timezone(tz_str)
-
-    kernel_name = planet_map.get(target_name.capitalize())
-    if not kernel_name:
+    for row, display_name in enumerate(names):
+        intervals = solved[row]["intervals"]
+        if not len(intervals):
+            continue
+
+        max_alt, best = window_peak(solved[row], np.split(end_altitudes[row], splits)[row])
+        visible_planets.append((
+            display_name,
+            max_alt,
+            to_local(ts, best, timezone),
+            to_local(ts, intervals[0, 0], timezone),
+            to_local(ts, intervals[-1, 1], timezone),
+        ))
+
+    return visible_planets, sunset, sunrise, moon_phase(now, precision)
+
+# Yield (date, visible_from, visible_to) for the coming nights when a planet is above the threshold
+# (10° or a horizon_mask table) between sunset and midnight, nearest first; times are UTC datetimes.
+# Nights are solved chunk_nights at a time as the generator is consumed. With cache=True nights
+# computed by earlier runs come from forecast_cache and only the others are solved. The search
+# starts the night after start_date (default: today at the site).
+def next_visible_nights(observer, target_name, horizon_days=120, step_minutes=60, chunk_nights=30,
+                        precision="high", cache=True, threshold=10.0, start_date=None):
+    target_name = target_name.capitalize()
+    if target_name not in planet_map:
         raise ValueError(f"Invalid planet name: {target_name}")
 
-    planet = planets[kernel_name]
-    found = []
-
-    # Check next 120 days
-    for i in range(1, 121):
-        date = datetime.now(timezone).date() + timedelta(days=i)
-        city = LocationInfo(latitude=lat, longitude=lon, timezone=tz_str)
-        s = sun(city.observer, date=date, tzinfo=timezone)
-        sunset = s["sunset"]
-        midnight = datetime.combine(date, datetime.min.time(), tzinfo=timezone) + timedelta(hours=22, minutes=59)
-
-        # Sample time range between sunset and midnight
-        times = []
-        current_time = sunset
-        while current_time < midnight:
-            times.append(ts.from_datetime(current_time))
-            current_time += timedelta(minutes=15)
-
-        first_visible = None
-        last_visible = None
-        for t in times:
-            alt, _, _ = observer.at(t).observe(planet).apparent().altaz()
-            alt_deg = alt.degrees
-            dt = t.utc_datetime().replace(tzinfo=pytz.UTC).astimezone(timezone)
-            if alt_deg > 10:
-                if first_visible is None:
-                    first_visible = dt
-                last_visible = dt
-
-        # If visible, log the date and time range
-        if first_visible and last_visible:
-            found.append((date.strftime('%b %d'), first_visible.strftime('%I:%M %p'), last_visible.strftime('%I:%M %p')))
-            if len(found) >= 5:
-                break  # Limit to 5 dates
-
-    return found
+    today = observer.today() if start_date is None else start_date
+    dates = [today + timedelta(days=i) for i in range(1, horizon_days + 1)]
+    params = {"target": target_name, "threshold": threshold_key(threshold), "step": step_minutes,
+              "kernel": ephemeris.KERNEL if precision == "high" else "fast", "timezone": observer.timezone.zone}
+
+    def solve(chunk):
+        return visible_evenings(observer, target_name, chunk, step_minutes, precision, threshold)
+
+    for chunk_start in range(0, horizon_days, chunk_nights):
+        chunk = dates[chunk_start:chunk_start + chunk_nights]
+        if cache:
+            nights = forecast_cache.cached_nights("next-visible", observer.latitude, observer.longitude, chunk, params, solve)
+        else:
+            nights = solve(chunk)
+
+        for day in chunk:
+            night = nights[day]
+            if night["visible_from"] is not None:
+                yield day, datetime.fromisoformat(night["visible_from"]), datetime.fromisoformat(night["visible_to"])
+
+# The first max_results nights of next_visible_nights, formatted as ('Mon DD', 'HH:MM AM', 'HH:MM PM') in local time
+def find_next_visible_dates(observer, target_name, max_results=5, horizon_days=120,
+                            step_minutes=60, chunk_nights=30, precision="high", cache=True, threshold=10.0,
+                            start_date=None):
+    timezone = observer.timezone
+    nights = next_visible_nights(observer, target_name, horizon_days, step_minutes, chunk_nights, precision, cache,
+                                 threshold, start_date)
+    return [
+        (day.strftime('%b %d'), start.astimezone(timezone).strftime('%I:%M %p'), end.astimezone(timezone).strftime('%I:%M %p'))
+        for day, start, end in itertools.islice(nights, max_results)
+    ]
+
+# Solve when a planet is above the threshold (10° or a horizon_mask table) between dark and midnight
+# on each of the given dates.
+# Returns {date: {"dark_start": TT or None, "visible_from": UTC ISO or None, "visible_to": ...}}.
+def visible_evenings(observer, target_name, dates, step_minutes=60, precision="high", threshold=10.0):
+    ts = get_timescale()
+    timezone = observer.timezone
+    step = step_minutes / 1440.0
+
+    # Evenings run from sunset (or local noon during polar night) to midnight
+    first = min(dates)
+    nights = observer.twilight(first, (max(dates) - first).days + 1, precision)
+    offsets = [(day - first).days for day in dates]
+    dark_start = nights["dark_start"][offsets]
+    midnights = [timezone.localize(datetime.combine(day, time(23, 59))) for day in dates]
+    evenings = np.column_stack([dark_start, ts.from_datetimes(midnights).tt])
+    has_dark = evenings[:, 0] < evenings[:, 1]  # False for NaN (polar day) too
+
+    results = {day: {"dark_start": None if np.isnan(tt) else tt, "visible_from": None, "visible_to": None}
+               for day, tt in zip(dates, dark_start)}
+    if not has_dark.any():
+        return results
+
+    # Solve the windows above the threshold once over all the evenings, then keep the evening parts
+    evenings = evenings[has_dark]
+    altitude_at = planet_altitude_function([target_name], observer, ts, evenings[0, 0], evenings[-1, 1], step, precision)
+    solved = altitude_windows(altitude_at, ts, evenings[0, 0], evenings[-1, 1], threshold, step)[0]
+    visible = intersect_intervals(solved["intervals"], evenings)
+    night_of = np.searchsorted(evenings[:, 0], visible[:, 0], side="right") - 1
+
+    # Reduce per evening: first rise above and last set below the threshold
+    dark_dates = [day for day, keep in zip(dates, has_dark) if keep]
+    dark_midnights = [m for m, keep in zip(midnights, has_dark) if keep]
+    for n in np.unique(night_of):
+        first_tt = visible[night_of == n, 0].min()
+        last_tt = visible[night_of == n, 1].max()
+        # Still up at midnight: keep the exact end rather than its round trip through TT
+        last_visible = dark_midnights[n] if last_tt >= evenings[n, 1] else ts.tt_jd(last_tt).utc_datetime()
+        results[dark_dates[n]].update(
+            visible_from=ts.tt_jd(first_tt).utc_datetime().isoformat(),
+            visible_to=last_visible.astimezone(pytz.utc).isoformat(),
+        )
+    return results
 
 # Command-line entry point
-def main():
+def main(argv=None, prog=None):
     parser = argparse.ArgumentParser(
+        prog=prog,
         description="🔭 Planet Viewer: See which planets are visible tonight!"
     )
     parser.add_argument("city", type=str, help="City name, e.g. 'New York'")
     parser.add_argument("--next-visible", type=str, help="Show next nights when a planet (e.g. 'Mars') is visible between sunset and midnight")
-    args = parser.parse_args()
-
-    try:
-        lat, lon, timezone_str = get_coordinates_and_timezone(args.city)
-
-        # Option: list next visible nights for a specific planet
-        if args.next_visible:
-            planet_name = args.next_visible.capitalize()
-            print(f"\n🔎 Upcoming Ideal Viewing Dates for {planet_name} in {args.city}:\n")
-            upcoming = find_next_visible_dates(lat, lon, timezone_str, planet_name)
-            if upcoming:
-                for date, start, end in upcoming:
-                    print(f"  📅 {date} - Visible from {start} to {end}")
-            else:
-                print("  No ideal dates found in the next 120 days.")
-            return
-
-        # Default: show tonight's visibility
-        planets, sunset, sunrise, moon = find_visible_planets(lat, lon, timezone_str)
-
-        print(f"\n🌍 Location: {args.city} ({lat:.2f}, {lon:.2f})")
-        print(f"🕒 Sunset: {sunset.strftime('%I:%M %p')}")
-        print(f"🕒 Sunrise: {sunrise.strftime('%I:%M %p')}")
-        print(f"🌙 Moon phase: {moon}")
-        print("\n🔭 Visible planets tonight (above 10° altitude):\n")
-
-        if planets:
-            for name, alt, best, start, end in sorted(planets, key=lambda x: -x[1]):
-                print(f"  {name:<8} - Highest Altitude: {alt:.1f}° at {best.strftime('%I:%M %p')}")
-                print(f"             👁️ Visible from {start.strftime('%I:%M %p')} to {end.strftime('%I:%M %p')}\n")
-        else:
-            print("  No planets visible tonight above 10°.")
-
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    parser.add_argument("--horizon", type=int, default=120, help="Number of nights to search with --next-visible (default: 120)")
+    parser.add_argument("--count", type=int, default=5, help="Number of nights to list with --next-visible (default: 5)")
+    parser.add_argument("--offline", action="store_true", help="Resolve the city from the local cache only")
+    parser.add_argument("--step", type=float, default=60, help="Bracketing step in minutes for the window solver (default: 60)")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every night instead of reusing cached results")
+    parser.add_argument("--horizon-mask", metavar="FILE",
+                        help="Skyline file of 'azimuth altitude' lines to clear instead of a flat 10°")
+    parser.add_argument("--fast", action="store_true",
+                        help="Use low-precision analytic positions (arcminute accuracy, no kernel file)")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.session(args):
+        try:
+            observer = observer_for_city(args.city, offline=args.offline)
+            precision = "low" if args.fast else "high"
+            threshold = load_mask(args.horizon_mask) if args.horizon_mask else 10.0
+
+            # Option: list next visible nights for a specific planet, each printed as soon as it is solved
+            if args.next_visible:
+                planet_name = args.next_visible.capitalize()
+                nights = metrics.spanned("compute", next_visible_nights(
+                    observer, planet_name, horizon_days=args.horizon, step_minutes=args.step,
+                    precision=precision, cache=not args.no_cache, threshold=threshold))
+                nights = itertools.islice(nights, args.count)
+                timezone = observer.timezone
+                if args.format != "text":
+                    rows = ({"date": day, "visible_from": start, "visible_to": end} for day, start, end in nights)
+                    output.write_rows(rows, args.format, next_visible_fields, timezone)
+                    return
+
+                print(f"\n🔎 Upcoming Ideal Viewing Dates for {planet_name} in {args.city}:\n")
+                found = False
+                for day, start, end in nights:
+                    with metrics.span("render"):
+                        print(f"  📅 {day.strftime('%b %d')} - Visible from {start.astimezone(timezone).strftime('%I:%M %p')} "
+                              f"to {end.astimezone(timezone).strftime('%I:%M %p')}")
+                    found = True
+                if not found:
+                    print(f"  No ideal dates found in the next {args.horizon} days.")
+                return
+
+            # Default: show tonight's visibility
+            with metrics.span("compute"):
+                planets, sunset, sunrise, moon = find_visible_planets(observer, step_minutes=args.step,
+                                                                      precision=precision, threshold=threshold)
+
+            if args.format != "text":
+                output.write_rows(tonight_rows(planets, sunset, sunrise, moon), args.format, tonight_fields,
+                                  observer.timezone)
+                return
+            with metrics.span("render"):
+                print_tonight(args.city, observer.latitude, observer.longitude, planets, sunset, sunrise, moon, masked=is_mask(threshold))
+
+        except Exception as e:
+            output.report_error(f"❌ Error: {e}", args.format)
+
+# Output rows for --format: one per planet visible tonight, highest first, with times in UTC
+def tonight_rows(planets, sunset, sunrise, moon):
+    sunset, sunrise = sunset.astimezone(pytz.utc), sunrise.astimezone(pytz.utc)
+    for name, alt, best, start, end in sorted(planets, key=lambda x: -x[1]):
+        yield {"name": name, "max_altitude": alt, "best_time": best.astimezone(pytz.utc),
+               "visible_from": start.astimezone(pytz.utc), "visible_to": end.astimezone(pytz.utc),
+               "sunset": sunset, "sunrise": sunrise, "moon_phase": moon}
+
+tonight_fields = ("name", "max_altitude", "best_time", "visible_from", "visible_to", "sunset", "sunrise", "moon_phase")
+next_visible_fields = ("date", "visible_from", "visible_to")
+
+def print_tonight(city, lat, lon, planets, sunset, sunrise, moon, masked=False):
+    limit = "the horizon mask" if masked else "10° altitude"
+    print(f"\n🌍 Location: {city} ({lat:.2f}, {lon:.2f})")
+    print(f"🕒 Sunset: {sunset.strftime('%I:%M %p')}")
+    print(f"🕒 Sunrise: {sunrise.strftime('%I:%M %p')}")
+    print(f"🌙 Moon phase: {moon}")
+    print(f"\n🔭 Visible planets tonight (above {limit}):\n")
+
+    if planets:
+        for name, alt, best, start, end in sorted(planets, key=lambda x: -x[1]):
+            print(f"  {name:<8} - Highest Altitude: {alt:.1f}° at {best.strftime('%I:%M %p')}")
+            print(f"             👁️ Visible from {start.strftime('%I:%M %p')} to {end.strftime('%I:%M %p')}\n")
+    else:
+        print(f"  No planets visible tonight above {limit}.")
 
 # Start script
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+
+from ephemeris import get_timescale, warm_up
+import geocentric_tables
+from observer_context import observer_for_city
+from output import json_default
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _location(city, offline):
+    return observer_for_city(city, offline=_flag(offline))
+
+
+def _precision(value, choices=("high", "low")):
+    # Unknown values are rejected (400) rather than silently treated as another engine
+    if value not in choices:
+        raise ValueError(f"Unknown precision '{value}': expected one of {', '.join(choices)}")
+    if value == "tables" and not geocentric_tables.TABLES:
+        raise ValueError("precision=tables needs tables: set ASTRO_EVENTS_TABLES before starting the server")
+    return value
+
+
+# Query handlers; these run inside the worker processes, each of which keeps
+# the ObserverContext of the cities it has seen
+
+def planets_now(city, min_angle="10", offline="0", precision="high"):
+    from current_planet_position import get_sky_status
+    precision = _precision(precision, ("high", "low", "tables"))
+    observer = _location(city, offline)
+    is_daytime, positions = get_sky_status(observer, get_timescale(), float(min_angle), precision)
+    return {
+        "city": city,
+        "is_daytime": is_daytime,
+        "planets": [
+            {"name": name, "altitude": alt, "azimuth": az, "visible": visible}
+            for name, alt, az, visible in positions
+        ],
+    }
+
+
+def planets_tonight(city, step="60", offline="0", precision="high"):
+    from planet_viewer import find_visible_planets
+    precision = _precision(precision)
+    observer = _location(city, offline)
+    planets, sunset, sunrise, moon = find_visible_planets(observer, step_minutes=float(step), precision=precision)
+    return {
+        "city": city,
+        "sunset": sunset,
+        "sunrise": sunrise,
+        "moon_phase": moon,
+        "planets": [
+            {"name": name, "max_altitude": alt, "best_time": best, "visible_from": start, "visible_to": end}
+            for name, alt, best, start, end in sorted(planets, key=lambda x: -x[1])
+        ],
+    }
+
+
+def next_visible(city, planet, horizon="120", count="5", offline="0", precision="high"):
+    from planet_viewer import find_next_visible_dates
+    precision = _precision(precision)
+    observer = _location(city, offline)
+    found = find_next_visible_dates(observer, planet, max_results=int(count), horizon_days=int(horizon),
+                                    precision=precision)
+    return {
+        "city": city,
+        "planet": planet.capitalize(),
+        "dates": [{"date": day, "visible_from": start, "visible_to": end} for day, start, end in found],
+    }
+
+
+def dso(city, days="1", step="5", offline="0"):
+    from deep_object import find_best_times
+    observer = _location(city, offline)
+    return {
+        "city": city,
+        "nights": [
+            {"date": day, "condition": condition, "moon": moon,
+             "objects": [{"name": name, "best_time": best} for name, best in best_times]}
+            for day, condition, best_times, moon in find_best_times(observer, int(days), step_minutes=float(step))
+        ],
+    }
+
+
+def sun_directions(city, year=None, offline="0"):
+    from sun_directions import monthly_sun_events, seasonal_events
+    observer = _location(city, offline)
+    year = int(year) if year else observer.today().year
+    sunrise_events, sunset_events = monthly_sun_events(observer, year)
+    return {
+        "city": city,
+        "events": [
+            {"event": label, "month": month, "date": event_time.date(), "azimuth": az, "altitude": alt}
+            for label, event_time, az, alt, month in sunrise_events + sunset_events
+        ],
+        "seasons": [
+            {"event": name, "time": local_dt, "azimuth": az, "altitude": alt}
+            for name, local_dt, az, alt in seasonal_events(observer, year)
+        ],
+    }
+
+
+def next_event(city, offline="0"):
+    from sun_moon_events import find_next_event, azimuth_to_compass
+    observer = _location(city, offline)
+    event_time, kind, body_name, alt, az = find_next_event(observer)
+    return {
+        "city": city,
+        "event": kind,
+        "body": body_name,
+        "time": event_time,
+        "azimuth": az,
+        "direction": azimuth_to_compass(az),
+        "altitude": alt,
+    }
+
+
+handlers = {
+    "/planets-now": planets_now,
+    "/planets-tonight": planets_tonight,
+    "/next-visible": next_visible,
+    "/dso": dso,
+    "/sun-directions": sun_directions,
+    "/next-event": next_event,
+}
+
+
+def run_query(path, params):
+    """Run one query and return its JSON-encoded result (called in a worker)."""
+    return json.dumps(handlers[path](**params), default=json_default, ensure_ascii=False)
+
+
+class QueryServer:
+    """HTTP/JSON front end that hands queries to a pool of warm worker processes.
+
+    Identical queries arriving while one is already running share its result.
+    """
+
+    def __init__(self, workers=None):
+        self.pool = ProcessPoolExecutor(workers or os.cpu_count(), initializer=warm_up)
+        self.in_flight = {}
+
+    async def query(self, path, params):
+        key = (path, tuple(sorted(params.items())))
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(loop.run_in_executor(self.pool, run_query, path, params))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shield so one client disconnecting does not cancel the shared work
+        return await asyncio.shield(future)
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Headers are not needed
+            status, body = await self.respond(request_line)
+        except Exception as e:
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({"error": str(e)})
+
+        payload = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+        writer.close()
+
+    async def respond(self, request_line):
+        if len(request_line) < 2 or request_line[0] != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, json.dumps({"error": "Only GET is supported"})
+        url = urlsplit(request_line[1])
+        if url.path not in handlers:
+            return HTTPStatus.NOT_FOUND, json.dumps({"error": f"Unknown query {url.path}", "queries": sorted(handlers)})
+        try:
+            return HTTPStatus.OK, await self.query(url.path, dict(parse_qsl(url.query)))
+        except (TypeError, ValueError) as e:
+            return HTTPStatus.BAD_REQUEST, json.dumps({"error": str(e)})
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🔭 Serving {', '.join(sorted(handlers))} on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the astro_events queries over a local HTTP/JSON API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(QueryServer(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Small SQLite key-value tables shared by the location and forecast caches.
+# Every table has a text key, its own value columns, and created / accessed
+# times: entries expire ttl_days after they were stored, and beyond
+# max_entries the least recently used are evicted. The directory can be
+# moved with ASTRO_EVENTS_CACHE_DIR.
+DEFAULT_CACHE_DIR = os.environ.get("ASTRO_EVENTS_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "astro_events"))
+
+
+@contextmanager
+def connect(path, table, columns):
+    """Open the cache at path, creating table with columns ("name TYPE" strings); commit on success, always close."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    try:
+        with db:
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, {', '.join(columns)},"
+                       " created REAL, accessed REAL)")
+            yield db
+    finally:
+        db.close()
+
+
+def read(path, table, columns, keys, ttl_days):
+    """Return {key: row} for the keys stored less than ttl_days ago, marking them used; row holds the columns' values."""
+    now = time.time()
+    names = ", ".join(column.split()[0] for column in columns)
+    with connect(path, table, columns) as db:
+        rows = db.execute(
+            f"SELECT key, {names} FROM {table} WHERE created >= ? AND key IN ({','.join('?' * len(keys))})",
+            (now - ttl_days * 86400, *keys),
+        ).fetchall()
+        db.executemany(f"UPDATE {table} SET accessed = ? WHERE key = ?", [(now, row[0]) for row in rows])
+    return {row[0]: row[1:] for row in rows}
+
+
+def write(path, table, columns, rows, ttl_days, max_entries):
+    """Store {key: row}, then evict expired entries and the least recently used beyond max_entries."""
+    now = time.time()
+    with connect(path, table, columns) as db:
+        db.executemany(
+            f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * (len(columns) + 3))})",
+            [(key, *row, now, now) for key, row in rows.items()],
+        )
+        db.execute(f"DELETE FROM {table} WHERE created < ?", (now - ttl_days * 86400,))
+        db.execute(
+            f"DELETE FROM {table} WHERE key NOT IN (SELECT key FROM {table} ORDER BY accessed DESC LIMIT ?)",
+            (max_entries,),
+        )
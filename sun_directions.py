@@ -1,22 +1,11 @@
 import argparse
-from datetime import datetime, timedelta
-from skyfield.api import load, Topos
+from datetime import date, datetime, time, timedelta
 from skyfield import almanac
-from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
-import pytz
-
-def get_coordinates(city_name):
-    geolocator = Nominatim(user_agent="sun_direction_locator")
-    location = geolocator.geocode(city_name)
-    if not location:
-        raise ValueError(f"Could not find coordinates for city: {city_name}")
-    return location.latitude, location.longitude
-
-def get_timezone(lat, lon):
-    tf = TimezoneFinder()
-    tz_name = tf.timezone_at(lat=lat, lng=lon)
-    return pytz.timezone(tz_name)
+from ephemeris import get_ephemeris, get_timescale
+from observer_context import observer_for_city
+from twilight import sun_events, twilight_events
+import metrics
+import output
 
 def azimuth_to_compass(azimuth):
     directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
@@ -28,93 +17,170 @@ def print_event(label, dt, az, alt):
     compass = azimuth_to_compass(az)
     print(f"{label:<16} {dt:%Y-%m-%d} | Azimuth: {az:6.2f}° | Altitude: {alt:6.2f}° | Dir: {compass}")
 
-def sun_az_alt(lat, lon, ts, eph, time):
+def sun_az_alt(observer, eph, time):
+    """Return the Sun's (azimuth, altitude) in degrees at a time or array of times."""
     sun = eph['Sun']
-    earth = eph['earth']
-    observer = earth + Topos(latitude_degrees=lat, longitude_degrees=lon)
-    astrometric = observer.at(time).observe(sun).apparent()
+    astrometric = observer.vector.at(time).observe(sun).apparent()
+    metrics.observed(time)
     alt, az, _ = astrometric.altaz()
     return az.degrees, alt.degrees
 
-def find_sunrise_sunset(observer, ts, eph, dt, timezone):
-    t0 = ts.utc(dt.year, dt.month, dt.day)
-    t1 = ts.utc(dt.year, dt.month, dt.day + 1)
-    f = almanac.sunrise_sunset(eph, observer)
-    times, events = almanac.find_discrete(t0, t1, f)
-
-    sun_times = {}
-    for t, event in zip(times, events):
-        local_time = t.astimezone(timezone)
-        az, alt = sun_az_alt(observer.latitude.degrees, observer.longitude.degrees, ts, eph, t)
-        event_type = 'Sunrise' if event == 1 else 'Sunset'
-        sun_times[event_type] = (local_time.strftime("%H:%M:%S"), az, alt)
-    return sun_times
-
-def main(city, sort):
-    lat, lon = get_coordinates(city)
-    tz = get_timezone(lat, lon)
-
-    eph = load('de421.bsp')
-    ts = load.timescale()
-    observer = Topos(latitude_degrees=lat, longitude_degrees=lon)
-
-    print(f"Location: {city} ({lat:.2f}, {lon:.2f})\n")
-    print(f"{'Event':<16} {'Date':<10} | Azimuth    | Altitude   | Dir")
-
+def daily_sun_events(observer, year, years=1):
+    """Return one (date, sunrise, sunset) row per local day of one or more years.
+
+    sunrise and sunset are (utc_time, az, alt) tuples, or None on days
+    without that event (polar day or night). The events of the whole span
+    come from a single search and their positions from one vectorized call.
+    """
+    eph = get_ephemeris()
+    ts = get_timescale()
+    tz = observer.timezone
+    first_day = date(year, 1, 1)
+    last_day = date(year + years, 1, 1)
+    t0 = ts.from_datetime(tz.localize(datetime.combine(first_day, time())))
+    t1 = ts.from_datetime(tz.localize(datetime.combine(last_day, time())))
+
+    # Only the horizon crossings are wanted, not the twilights
+    times, names = sun_events(eph, observer.topos, t0, t1, events={-0.8333: twilight_events[-0.8333]})
+    days = {first_day + timedelta(days=i): {} for i in range((last_day - first_day).days)}
+    if names:
+        az, alt = sun_az_alt(observer, eph, times)
+        for i, utc_time in enumerate(times.utc_datetime()):
+            days[utc_time.astimezone(tz).date()][names[i]] = (utc_time, az[i], alt[i])
+
+    return [(day, events.get('sunrise'), events.get('sunset')) for day, events in days.items()]
+
+def monthly_sun_events(observer, year):
+    """Return (sunrise_events, sunset_events) for the 1st day of each month of a year."""
     sunrise_events = []
     sunset_events = []
 
-    for month in range(1, 13):
-        dt = datetime(datetime.now().year, month, 1, tzinfo=tz)
-        events = find_sunrise_sunset(observer, ts, eph, dt, tz)
-        
-        if 'Sunrise' in events:
-            time_str, az, alt = events['Sunrise']
-            hour, minute, second = map(int, time_str.split(":"))
-            event_time = datetime(dt.year, dt.month, dt.day, hour, minute, second, tzinfo=tz)
-            sunrise_events.append(('Sunrise', event_time, az, alt, month))
-        
-        if 'Sunset' in events:
-            time_str, az, alt = events['Sunset']
-            hour, minute, second = map(int, time_str.split(":"))
-            event_time = datetime(dt.year, dt.month, dt.day, hour, minute, second, tzinfo=tz)
-            sunset_events.append(('Sunset', event_time, az, alt, month))
-
-    if sort:
-        # Print all sunrises first
-        for label, event_time, az, alt, month in sunrise_events:
-            print_event(f"{label} {month:02}", event_time, az, alt)
-        # Then all sunsets
-        for label, event_time, az, alt, month in sunset_events:
-            print_event(f"{label} {month:02}", event_time, az, alt)
-    else:
-        # Interleave sunrise/sunset by month
-        for month in range(1, 13):
-            sr = next((e for e in sunrise_events if e[4] == month), None)
-            ss = next((e for e in sunset_events if e[4] == month), None)
-            if sr:
-                label, event_time, az, alt, _ = sr
-                print_event(f"{label} {month:02}", event_time, az, alt)
-            if ss:
-                label, event_time, az, alt, _ = ss
-                print_event(f"{label} {month:02}", event_time, az, alt)
-
-    # Solstices and Equinoxes
-    print("\nSeasonal Events:")
+    for day, sunrise, sunset in daily_sun_events(observer, year):
+        if day.day != 1:
+            continue
+        if sunrise:
+            sunrise_events.append(('Sunrise', sunrise[0].astimezone(observer.timezone), *sunrise[1:], day.month))
+        if sunset:
+            sunset_events.append(('Sunset', sunset[0].astimezone(observer.timezone), *sunset[1:], day.month))
+
+    return sunrise_events, sunset_events
+
+def print_daily_table(city, observer, rows):
+    print(f"Location: {city} ({observer.latitude:.2f}, {observer.longitude:.2f}) | Timezone: {observer.timezone.zone}\n")
+    print(f"{'Date':<10} | {'Sunrise':<8} | Azimuth | {'Sunset':<8} | Azimuth")
+    tz = observer.timezone
+    for day, sunrise, sunset in rows:
+        sunrise_text = f"{sunrise[0].astimezone(tz):%H:%M:%S} | {sunrise[1]:6.2f}°" if sunrise else f"{'--':<8} | {'--':>7}"
+        sunset_text = f"{sunset[0].astimezone(tz):%H:%M:%S} | {sunset[1]:6.2f}°" if sunset else f"{'--':<8} | {'--':>7}"
+        print(f"{day:%Y-%m-%d} | {sunrise_text} | {sunset_text}")
+
+# Output rows for --format: one per event, or one per day with --daily
+def event_rows(events):
+    for name, event_time, az, alt in events:
+        yield {"event": name, "time": event_time, "azimuth": az, "altitude": alt, "direction": azimuth_to_compass(az)}
+
+def daily_rows(rows):
+    for day, sunrise, sunset in rows:
+        yield {
+            "date": day,
+            "sunrise": sunrise[0] if sunrise else None,
+            "sunrise_azimuth": sunrise[1] if sunrise else None,
+            "sunset": sunset[0] if sunset else None,
+            "sunset_azimuth": sunset[1] if sunset else None,
+        }
+
+event_fields = ("event", "time", "azimuth", "altitude", "direction")
+daily_fields = ("date", "sunrise", "sunrise_azimuth", "sunset", "sunset_azimuth")
+
+def seasonal_events(observer, year):
+    """Return (name, local_time, az, alt) for the solstices and equinoxes of a year."""
+    eph = get_ephemeris()
+    ts = get_timescale()
     f = almanac.seasons(eph)
-    t0 = ts.utc(datetime.now().year, 1, 1)
-    t1 = ts.utc(datetime.now().year + 1, 1, 1)
+    t0 = ts.utc(year, 1, 1)
+    t1 = ts.utc(year + 1, 1, 1)
     times, events = almanac.find_discrete(t0, t1, f)
     season_names = ['Spring Equinox', 'Summer Solstice', 'Autumn Equinox', 'Winter Solstice']
 
-    for t, e in zip(times, events):
-        local_dt = t.astimezone(tz)
-        az, alt = sun_az_alt(lat, lon, ts, eph, t)
-        print_event(season_names[e], local_dt, az, alt)
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Sun directions for 1st day of each month and solstices/equinoxes.")
+    az, alt = sun_az_alt(observer, eph, times)
+    return [
+        (season_names[e], local_time, az[i], alt[i])
+        for i, (local_time, e) in enumerate(zip(times.astimezone(observer.timezone), events))
+    ]
+
+def main(city, sort, offline=False, daily=False, year=None, years=1, fmt="text"):
+    try:
+        observer = observer_for_city(city, offline=offline)
+    except Exception as e:
+        output.report_error(f"❌ Error: {e}", fmt)
+        return
+    year = year or observer.today().year
+
+    if daily:
+        with metrics.span("compute"):
+            rows = daily_sun_events(observer, year, years)
+        if fmt != "text":
+            output.write_rows(daily_rows(rows), fmt, daily_fields, observer.timezone)
+            return
+        with metrics.span("render"):
+            print_daily_table(city, observer, rows)
+        return
+
+    with metrics.span("compute"):
+        sunrise_events, sunset_events = monthly_sun_events(observer, year)
+        seasons = seasonal_events(observer, year)
+
+    if fmt != "text":
+        if sort:
+            monthly = sunrise_events + sunset_events
+        else:
+            monthly = sorted(sunrise_events + sunset_events, key=lambda e: e[1])
+        events = [(f"{label} {month:02}", event_time, az, alt) for label, event_time, az, alt, month in monthly]
+        output.write_rows(event_rows(events + seasons), fmt, event_fields)
+        return
+
+    with metrics.span("render"):
+        print(f"Location: {city} ({observer.latitude:.2f}, {observer.longitude:.2f})\n")
+        print(f"{'Event':<16} {'Date':<10} | Azimuth    | Altitude   | Dir")
+
+        if sort:
+            # Print all sunrises first
+            for label, event_time, az, alt, month in sunrise_events:
+                print_event(f"{label} {month:02}", event_time, az, alt)
+            # Then all sunsets
+            for label, event_time, az, alt, month in sunset_events:
+                print_event(f"{label} {month:02}", event_time, az, alt)
+        else:
+            # Interleave sunrise/sunset by month
+            for month in range(1, 13):
+                sr = next((e for e in sunrise_events if e[4] == month), None)
+                ss = next((e for e in sunset_events if e[4] == month), None)
+                if sr:
+                    label, event_time, az, alt, _ = sr
+                    print_event(f"{label} {month:02}", event_time, az, alt)
+                if ss:
+                    label, event_time, az, alt, _ = ss
+                    print_event(f"{label} {month:02}", event_time, az, alt)
+
+        # Solstices and Equinoxes
+        print("\nSeasonal Events:")
+        for name, local_dt, az, alt in seasons:
+            print_event(name, local_dt, az, alt)
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Sun directions for 1st day of each month and solstices/equinoxes.")
     parser.add_argument("city", help="City name (e.g., 'Cincinnati, OH')")
     parser.add_argument("--sort", action="store_true", help="Print all sunrises first, then all sunsets")
-    args = parser.parse_args()
-    main(args.city, args.sort)
+    parser.add_argument("--offline", action="store_true", help="Resolve the city from the local cache only")
+    parser.add_argument("--daily", action="store_true", help="Print sunrise and sunset for every day instead")
+    parser.add_argument("--year", type=int, help="First year to cover (default: current year)")
+    parser.add_argument("--years", type=int, default=1, help="Number of years for --daily (default: 1)")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    with metrics.session(args):
+        main(args.city, args.sort, offline=args.offline, daily=args.daily, year=args.year, years=args.years,
+             fmt=args.format)
+
+if __name__ == "__main__":
+    cli()
@@ -1,10 +1,12 @@
-from skyfield.api import load, Topos
+import argparse
 from skyfield.almanac import find_discrete, risings_and_settings
-from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
-from datetime import datetime, timedelta, timezone
-import pytz
-import math
+import itertools
+from locations import resolve_location
+from ephemeris import get_ephemeris, get_timescale
+from current_planet_position import planet_names
+from observer_context import observer_for
+import metrics
+import output
 
 # Compass direction from azimuth degrees
 def azimuth_to_compass(azimuth):
@@ -12,71 +14,121 @@ def azimuth_to_compass(azimuth):
     index = round(azimuth / 45) % 8
     return directions[index]
 
-# Get lat, lon, and timezone from city name
-def get_location_info(city_name):
-    geolocator = Nominatim(user_agent="astro_locator")
-    location = geolocator.geocode(city_name, exactly_one=True)
-    if location is None:
-        raise ValueError(f"City '{city_name}' not found.")
-    lat, lon = location.latitude, location.longitude
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lat=lat, lng=lon)
-    timezone = pytz.timezone(timezone_str)
-    print(f"Resolved location: {location.address}")
-    return lat, lon, timezone
+# Resolve a city name to the ObserverContext of its site
+def get_location_info(city_name, offline=False, quiet=False):
+    location = resolve_location(city_name, offline=offline)
+    if not quiet:
+        print(f"Resolved location: {location['address']}")
+    return observer_for(location["latitude"], location["longitude"], location["timezone"])
+
+# Bodies the event stream can follow: display name -> kernel key
+event_bodies = {'Sun': 'Sun', 'Moon': 'Moon', **planet_names}
+
+def _event_kind(body_name, rising):
+    if body_name in ('Sun', 'Moon'):
+        return body_name.lower() + ('rise' if rising else 'set')
+    return 'rise' if rising else 'set'
+
+# Yield (local time, kind, body name, alt, az) for every rise/set seen by observer, in time order
+def event_stream(observer, bodies=('Sun', 'Moon'), start=None, max_days=366, max_chunk_days=32):
+    """Search ahead in chunks that double in length, so asking for the next
+    event costs about a day of search and the next 50 only a few chunks.
+    Stops after max_days if no further events are found."""
+    ts = get_timescale()
+    eph = get_ephemeris()
+    tz = observer.timezone
+    location = observer.vector
+    searches = {name: risings_and_settings(eph, eph[event_bodies[name]], observer.topos) for name in bodies}
+
+    t0 = ts.now() if start is None else start
+    end = t0 + max_days
+    chunk_days = 1.0
+    while t0.tt < end.tt:
+        t1 = ts.tt_jd(min(t0.tt + chunk_days, end.tt))
+        events = []
+        for name, f in searches.items():
+            times, rising = find_discrete(t0, t1, f)
+            if not len(times):
+                continue
+            # Positions for all of this body's events in the chunk at once
+            alt, az, _ = location.at(times).observe(eph[event_bodies[name]]).apparent().altaz()
+            metrics.observed(times)
+            for i, local_time in enumerate(times.astimezone(tz)):
+                events.append((times.tt[i], local_time, _event_kind(name, rising[i]), name, alt.degrees[i], az.degrees[i]))
+
+        for event in sorted(events, key=lambda e: e[0]):
+            yield event[1:]
+        t0 = t1
+        chunk_days = min(chunk_days * 2, max_chunk_days)
+
+# Find the next Sun or Moon rise/set: (local time, kind, body name, alt, az)
+def find_next_event(observer, bodies=('Sun', 'Moon')):
+    event = next(event_stream(observer, bodies), None)
+    if event is None:
+        raise ValueError(f"No rise or set of {', '.join(bodies)} within the next year")
+    return event
+
+def event_label(kind, body_name):
+    if body_name in ('Sun', 'Moon'):
+        return f"{kind.capitalize()} of the {body_name}"
+    return f"{body_name} {kind}"
+
+# Output rows for --format: one per event
+def event_rows(events):
+    for event_time, kind, body_name, alt, az in events:
+        yield {"time": event_time, "event": kind, "body": body_name, "altitude": alt, "azimuth": az,
+               "direction": azimuth_to_compass(az)}
+
+event_fields = ("time", "event", "body", "altitude", "azimuth", "direction")
 
 # Main logic
-def main(city):
-    ts = load.timescale()
-    eph = load('de421.bsp')
-
-    lat, lon, tz = get_location_info(city)
-    observer = Topos(latitude_degrees=lat, longitude_degrees=lon)
-
-    t0 = ts.now()
-    t1 = ts.utc(datetime.now(timezone.utc) + timedelta(days=1))
-
-    f_sun = risings_and_settings(eph, eph['Sun'], observer)
-    f_moon = risings_and_settings(eph, eph['Moon'], observer)
-
-    times_sun, events_sun = find_discrete(t0, t1, f_sun)
-    times_moon, events_moon = find_discrete(t0, t1, f_moon)
-
-    events = []
-
-    for t, e in zip(times_sun, events_sun):
-        kind = 'sunrise' if e else 'sunset'
-        events.append((t.utc_datetime(), kind, 'Sun'))
-
-    for t, e in zip(times_moon, events_moon):
-        kind = 'moonrise' if e else 'moonset'
-        events.append((t.utc_datetime(), kind, 'Moon'))
-
-    # Sort all events and find the next one
-    now = datetime.now(timezone.utc)
-    next_event = min((e for e in events if e[0] > now), key=lambda x: x[0])
-
-    event_time_utc, kind, body_name = next_event
-    event_time_local = event_time_utc.astimezone(tz)
-
-    # Calculate azimuth at that moment
-    location = eph['earth'] + observer
-    t_event = ts.utc(event_time_utc)
-    astrometric = location.at(t_event).observe(eph[body_name])
-    alt, az, _ = astrometric.apparent().altaz()
-
-    compass_dir = azimuth_to_compass(az.degrees)
-
-    print(f"City: {city}")
-    print(f"Next event: {kind.capitalize()} of the {body_name}")
-    print(f"Time: {event_time_local.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    print(f"Azimuth: {az.degrees:.2f}° ({compass_dir})")
-    print(f"Altitude at event: {alt.degrees:.2f}°")
-
-if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser(description="Next Sun or Moon Rise/Set Info")
+def main(city, offline=False, bodies=('Sun', 'Moon'), count=1, fmt="text"):
+    try:
+        observer = get_location_info(city, offline=offline, quiet=fmt != "text")
+    except Exception as e:
+        output.report_error(f"❌ Error: {e}", fmt)
+        return
+
+    if fmt != "text":
+        events = metrics.spanned("compute", itertools.islice(event_stream(observer, bodies), count))
+        output.write_rows(event_rows(events), fmt, event_fields)
+        return
+
+    if count > 1:
+        print(f"City: {city}")
+        print(f"Next {count} events:")
+        # Each event is printed as soon as the search reaches it
+        events = metrics.spanned("compute", itertools.islice(event_stream(observer, bodies), count))
+        for event_time_local, kind, body_name, alt, az in events:
+            with metrics.span("render"):
+                print(f"{event_time_local.strftime('%Y-%m-%d %H:%M:%S %Z')}  {event_label(kind, body_name):<20} "
+                      f"Azimuth: {az:6.2f}° ({azimuth_to_compass(az)})")
+        return
+
+    with metrics.span("compute"):
+        event_time_local, kind, body_name, alt, az = find_next_event(observer, bodies)
+
+    with metrics.span("render"):
+        compass_dir = azimuth_to_compass(az)
+
+        print(f"City: {city}")
+        print(f"Next event: {event_label(kind, body_name)}")
+        print(f"Time: {event_time_local.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        print(f"Azimuth: {az:.2f}° ({compass_dir})")
+        print(f"Altitude at event: {alt:.2f}°")
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Next Sun or Moon Rise/Set Info")
     parser.add_argument("city", help="City name (e.g. 'Cincinnati, OH')")
-    args = parser.parse_args()
-    main(args.city)
+    parser.add_argument("--offline", action="store_true", help="Resolve the city from the local cache only")
+    parser.add_argument("--count", type=int, default=1, help="Number of upcoming events to list (default: 1)")
+    parser.add_argument("--bodies", nargs="+", choices=list(event_bodies), default=['Sun', 'Moon'], metavar="BODY",
+                        help="Bodies to follow: Sun, Moon or a planet name (default: Sun Moon)")
+    output.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+    with metrics.session(args):
+        main(args.city, offline=args.offline, bodies=args.bodies, count=args.count, fmt=args.format)
 
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+import pytest
+from skyfield.api import wgs84
+
+import ephemeris
+from catalog import catalog_altitudes, catalog_from_objects, catalog_visibility
+from deep_object import deep_sky_objects
+
+pytestmark = pytest.mark.skipif(not os.path.exists(ephemeris.get_loader().path_to(ephemeris.KERNEL)),
+                                reason="needs the ephemeris kernel (set ASTRO_EVENTS_KERNEL / ASTRO_EVENTS_DATA_DIR)")
+
+
+def test_best_times_match_a_fine_grid():
+    # Several objects transit between the 5-minute samples of the evening
+    eph, ts = ephemeris.get_ephemeris(), ephemeris.get_timescale()
+    catalog = catalog_from_objects(deep_sky_objects)
+    topos = wgs84.latlon(39.10, -84.51)
+    times = ts.linspace(ts.utc(2026, 8, 1, 0, 30), ts.utc(2026, 8, 1, 4), 43)
+    result = catalog_visibility(catalog, eph, topos, times)
+
+    fine = ts.linspace(times[0], times[-1], 7561)  # Every 5/3 seconds
+    (_, _, altitudes), = catalog_altitudes(catalog, eph, topos, fine)
+    best = altitudes.argmax(axis=1)
+    assert (times.tt[result["best_index"]] != fine.tt[best]).any()
+    assert np.allclose(result["best_time"], fine.tt[best], atol=2 / 86400)
+    assert np.allclose(result["peak_altitude"], altitudes.max(axis=1), atol=1e-5)
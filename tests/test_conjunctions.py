@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+import ephemeris
+from conjunctions import find_conjunctions
+from ephemeris import get_timescale
+
+pytestmark = pytest.mark.skipif(not os.path.exists(ephemeris.get_loader().path_to(ephemeris.KERNEL)),
+                                reason="needs the ephemeris kernel (set ASTRO_EVENTS_KERNEL / ASTRO_EVENTS_DATA_DIR)")
+
+
+def test_minimum_in_the_last_step():
+    # Moon and Mars are closest 4 hours before the end of the search
+    ts = get_timescale()
+    events = find_conjunctions(ts.utc(2021, 12, 20), ts.utc(2022, 1, 1), objects={})
+    assert [(first, second) for _, first, second, _ in events] == [("Moon", "Mars")]
+    time, _, _, separation = events[0]
+    assert f"{time:%Y-%m-%d %H:%M}" == "2021-12-31 19:52"
+    assert round(separation, 2) == 0.93
@@ -0,0 +1,40 @@
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+import ephemeris
+from ephemeris import get_ephemeris, get_timescale
+from moon_calendar import MOON_HORIZON, lunar_calendar
+from observer_context import ObserverContext
+
+pytestmark = pytest.mark.skipif(not os.path.exists(ephemeris.get_loader().path_to(ephemeris.KERNEL)),
+                                reason="needs the ephemeris kernel (set ASTRO_EVENTS_KERNEL / ASTRO_EVENTS_DATA_DIR)")
+
+
+def test_grazing_moon_at_tromso():
+    # The Moon is up for about half an hour, 17:28-18:00 UTC on 2026-10-19
+    observer = ObserverContext(69.65, 18.96, "Europe/Oslo")
+    eph, ts = get_ephemeris(), get_timescale()
+    calendar = lunar_calendar(eph, ts, observer.topos, observer.timezone, date(2026, 10, 19), 1)
+    rise, set_ = calendar["moonrise"][0], calendar["moonset"][0]
+    assert not np.isnan(rise) and not np.isnan(set_)
+
+    # Against a one-minute scan of the Moon's altitude
+    t = ts.tt_jd(np.arange(calendar["start"][0], calendar["end"][0], 1 / 1440))
+    alt = observer.vector.at(t).observe(eph["moon"]).apparent().altaz()[0].degrees
+    up = t.tt[alt >= MOON_HORIZON]
+    assert abs(rise - up[0]) < 2 / 1440
+    assert abs(set_ - up[-1]) < 2 / 1440
+
+
+def test_lunar_calendar_returns_copies():
+    observer = ObserverContext(39.10, -84.51, "America/New_York")
+    calendar = observer.lunar_calendar(date(2026, 10, 1), 5)
+    illumination = calendar["illumination"].copy()
+    calendar["illumination"][:] = 0.0
+    calendar["dates"].clear()
+    again = observer.lunar_calendar(date(2026, 10, 1), 5)
+    assert (again["illumination"] == illumination).all()
+    assert len(again["dates"]) == 5
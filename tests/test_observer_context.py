@@ -0,0 +1,25 @@
+from datetime import date
+
+from observer_context import ObserverContext
+
+
+def test_no_darkness_is_memoized():
+    # Midsummer at Tromsø: the Sun never sets, so there is no dark evening
+    observer = ObserverContext(69.65, 18.96, "Europe/Oslo")
+    assert observer.evening_samples(date(2026, 6, 21), 30, precision="low") is None
+    assert observer._memo[("evening", date(2026, 6, 21), 30, "low")] is None
+    assert observer.evening_samples(date(2026, 6, 21), 30, precision="low") is None
+
+
+def test_twilight_returns_copies():
+    observer = ObserverContext(39.10, -84.51, "America/New_York")
+    nights = observer.twilight(date(2026, 10, 1), 10, precision="low")
+    sunset = nights["sunset"].copy()
+    nights["sunset"][:] = 0.0
+    nights["dates"].clear()
+    again = observer.twilight(date(2026, 10, 1), 10, precision="low")
+    assert (again["sunset"] == sunset).all()
+    assert len(again["dates"]) == 10
+    # A range sliced out of the memoized one is a copy too
+    observer.twilight(date(2026, 10, 3), 2, precision="low")["sunset"][:] = 0.0
+    assert (observer.twilight(date(2026, 10, 1), 10, precision="low")["sunset"] == sunset).all()
@@ -0,0 +1,23 @@
+from datetime import date
+
+import numpy as np
+import pytz
+from skyfield.api import wgs84
+
+from ephemeris import get_timescale
+from twilight import find_twilight, sun_altitude
+
+
+def test_short_nights_near_the_arctic_circle():
+    # At 65.72°N the Sun dips below -0.833° for only 15-42 minutes in mid-June,
+    # well under the hourly sampling step
+    ts = get_timescale()
+    topos = wgs84.latlon(65.72, 22.15)
+    nights = find_twilight(None, ts, topos, pytz.timezone("Europe/Stockholm"), date(2025, 6, 14), 13)
+    assert list(nights["condition"]) == ["normal"] * 13
+    altitude_at = sun_altitude(None, topos)
+    for start, end, sunset, sunrise in zip(nights["start"], nights["end"], nights["sunset"], nights["sunrise"]):
+        grid = np.arange(start, end, 1 / 2880)
+        below = grid[altitude_at(ts.tt_jd(grid)) < -0.8333]
+        assert abs(sunset - below[0]) * 1440 < 1.0
+        assert abs(sunrise - below[-1]) * 1440 < 1.0
@@ -0,0 +1,28 @@
+import numpy as np
+
+from ephemeris import get_timescale
+from windows import altitude_windows
+
+TT0 = 2461000.5
+
+
+def grazing_pass(peak, height=10.5):
+    """Altitude function of a parabolic pass peaking at height degrees; 10.5° clears 10° for 49 minutes."""
+    curvature = 0.5 / (24.5 / 1440) ** 2
+    return lambda t: height - curvature * (t.tt - peak) ** 2
+
+
+def test_window_shorter_than_step():
+    # Peak 30 min off the hourly grid, with every sample below the threshold
+    peak = TT0 + 5.5 / 24
+    for step in (1 / 24, 1 / 96):
+        solved = altitude_windows(grazing_pass(peak), get_timescale(), TT0, TT0 + 1, 10.0, step)
+        assert solved["intervals"].shape == (1, 2)
+        assert np.allclose((solved["intervals"][:, 1] - solved["intervals"][:, 0]) * 1440, 49.0, atol=0.05)
+        assert np.allclose(solved["peaks"], peak, atol=1 / 86400)
+
+
+def test_transit_below_threshold_has_no_window():
+    solved = altitude_windows(grazing_pass(TT0 + 5.5 / 24, height=9.5), get_timescale(), TT0, TT0 + 1, 10.0, 1 / 24)
+    assert solved["intervals"].shape == (0, 2)
+    assert not len(solved["peaks"])
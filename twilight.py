@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, time
+import numpy as np
+import metrics
+from windows import refine_roots, target_altitude
+
+# Sun altitude thresholds in degrees, with the names of the events when
+# the Sun sinks below them at dusk and climbs back above them at dawn
+twilight_events = {
+    -0.8333: ("sunset", "sunrise"),
+    -6.0: ("civil_dusk", "civil_dawn"),
+    -12.0: ("nautical_dusk", "nautical_dawn"),
+    -18.0: ("astronomical_dusk", "astronomical_dawn"),
+}
+
+
+def sun_altitude(eph, topos):
+    """Return a function giving the Sun's apparent altitude in degrees at a Time.
+
+    With eph=None the low-precision analytic Sun from fast_ephemeris is
+    used and no kernel is needed.
+    """
+    if eph is None:
+        from fast_ephemeris import fast_altaz
+
+        def fast_altitude_at(t):
+            metrics.observed(t)
+            alt = fast_altaz(["Sun"], topos.latitude.degrees, topos.longitude.degrees, t, topos.elevation.m,
+                             topos.itrs_xyz.au)[0][0]
+            return alt if t.shape else alt[0]
+
+        return fast_altitude_at
+
+    return target_altitude(eph, topos, eph['sun'])
+
+
+def sun_events(eph, topos, t0, t1, step_days=1 / 24, epsilon=1 / 86400, events=twilight_events):
+    """Return the times and names of every sunrise, sunset, dusk and dawn between t0 and t1.
+
+    The Sun's altitude is sampled once on a coarse grid, every threshold
+    crossing is bracketed from those samples, and all brackets are then
+    refined together until they agree within epsilon days. The Sun's
+    turning points (its highest and lowest altitude of each day) are
+    bracketed and refined as well, so a dip below a threshold, or a climb
+    above it, shorter than the step is found from the turning point.
+    events maps the thresholds to solve to their (dusk, dawn) names, as
+    twilight_events does for all of them.
+    """
+    ts = t0.ts
+    altitude_at = sun_altitude(eph, topos)
+    jd = np.append(np.arange(t0.tt, t1.tt, step_days), t1.tt)
+    alt = altitude_at(ts.tt_jd(jd))
+
+    # Turning points: samples higher or lower than both neighbours, refined
+    # where the altitude's central difference changes sign
+    turn = np.flatnonzero(((alt[1:-1] > alt[:-2]) & (alt[1:-1] >= alt[2:]))
+                          | ((alt[1:-1] < alt[:-2]) & (alt[1:-1] <= alt[2:]))) + 1
+    h = min(step_days / 10, 1 / 1440)
+
+    def climb(x):
+        values = altitude_at(ts.tt_jd(np.concatenate([x + h, x - h])))
+        return values[:len(x)] - values[len(x):]
+
+    turns, turn_alt = np.zeros(0), np.zeros(0)
+    if len(turn):
+        ends = climb(np.concatenate([jd[turn - 1], jd[turn + 1]]))
+        turns = refine_roots(climb, jd[turn - 1], jd[turn + 1], ends[:len(turn)], ends[len(turn):], epsilon)
+        turn_alt = altitude_at(ts.tt_jd(turns))
+
+    # Bracket the crossings of every threshold from the same samples. A turning
+    # point on the other side of a threshold than its own sample crosses it
+    # twice between the neighbouring samples: once on each side of the turn.
+    a, b, fa, fb, thresholds, names = [], [], [], [], [], []
+    for threshold, (dusk, dawn) in events.items():
+        above = alt >= threshold
+        idx = np.flatnonzero(above[:-1] != above[1:])
+        missed = np.flatnonzero((turn_alt >= threshold) != above[turn])
+        before, after = turn[missed] - 1, turn[missed] + 1
+        a.extend([jd[idx], jd[before], turns[missed]])
+        b.extend([jd[idx + 1], turns[missed], jd[after]])
+        fa.extend([alt[idx], alt[before], turn_alt[missed]])
+        fb.extend([alt[idx + 1], turn_alt[missed], alt[after]])
+        thresholds.append(np.full(len(idx) + 2 * len(missed), threshold))
+        names.extend(dawn if rising else dusk for rising in above[idx + 1])
+        names.extend(dawn if rising else dusk for rising in turn_alt[missed] >= threshold)
+        names.extend(dusk if rising else dawn for rising in turn_alt[missed] >= threshold)
+    a, b, fa, fb, thresholds = (np.concatenate(v) for v in (a, b, fa, fb, thresholds))
+    if not len(a):
+        return ts.tt_jd(np.array([])), []
+
+    # Refine all brackets at once
+    x = refine_roots(lambda jd: altitude_at(ts.tt_jd(jd)) - thresholds, a, b, fa - thresholds, fb - thresholds, epsilon)
+
+    order = np.argsort(x)
+    return ts.tt_jd(x[order]), [names[i] for i in order]
+
+
+def find_twilight(eph, ts, topos, timezone, start_date, days=1):
+    """Return sunset, sunrise and twilight times for each night of a date range.
+
+    A night runs from local noon on its date to local noon the next day.
+    The result is a dict of arrays, one entry per night, holding TT Julian
+    dates (NaN where the event does not happen that night) for every event
+    name in twilight_events, plus:
+
+    - "dates": the local date each night starts on
+    - "start" / "end": TT of the local noons bounding the night
+    - "dark_start" / "dark_end": the span with the Sun below the horizon,
+      from sunset (or the start of the night) to sunrise (or its end);
+      NaN during polar day
+    - "condition": "normal", "polar_day" or "polar_night"
+    """
+    dates = [start_date + timedelta(days=i) for i in range(days + 1)]
+    noons = ts.from_datetimes([timezone.localize(datetime.combine(d, time(12))) for d in dates])
+    edges = noons.tt
+
+    result = {"dates": dates[:-1], "start": edges[:-1], "end": edges[1:]}
+    events = {}
+    dusk_names = set()
+    for dusk, dawn in twilight_events.values():
+        events[dusk] = np.full(days, np.inf)
+        events[dawn] = np.full(days, -np.inf)
+        dusk_names.add(dusk)
+
+    times, names = sun_events(eph, topos, noons[0], noons[-1])
+    nights = np.searchsorted(edges, times.tt, side="right") - 1
+    for night, tt, name in zip(nights, times.tt, names):
+        # Keep the first dusk and the last dawn of each night
+        pick = min if name in dusk_names else max
+        events[name][night] = pick(events[name][night], tt)
+    for name, values in events.items():
+        values[np.isinf(values)] = np.nan
+        result[name] = values
+
+    # Fall back to the night's bounds when the Sun is already down there
+    sun_down = sun_altitude(eph, topos)(noons) < -0.8333
+    sunset, sunrise = result["sunset"], result["sunrise"]
+    dark_start = np.where(np.isnan(sunset) & sun_down[:-1], edges[:-1], sunset)
+    dark_end = np.where(np.isnan(sunrise) & sun_down[1:], edges[1:], sunrise)
+    polar_day = np.isnan(dark_start) | np.isnan(dark_end)
+    dark_start[polar_day] = np.nan
+    dark_end[polar_day] = np.nan
+    result["dark_start"] = dark_start
+    result["dark_end"] = dark_end
+
+    condition = np.full(days, "normal", dtype=object)
+    condition[np.isnan(sunset) & np.isnan(sunrise) & ~polar_day] = "polar_night"
+    condition[polar_day] = "polar_day"
+    result["condition"] = condition
+    return result
+
+
+def to_local(ts, tt, timezone):
+    """Convert a TT Julian date from find_twilight to a local datetime, or None if NaN."""
+    if np.isnan(tt):
+        return None
+    return ts.tt_jd(tt).astimezone(timezone)
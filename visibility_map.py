@@ -0,0 +1,142 @@
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+from skyfield.framelib import true_equator_and_equinox_of_date
+from skyfield.nutationlib import iau2000b_radians
+
+from ephemeris import get_ephemeris, get_timescale
+from fast_ephemeris import geocentric_xyz, horizon_coordinates
+from geocentric_tables import get_tables, interpolate_geocentric, set_tables, table_bodies
+import metrics
+
+
+def grid_axes(resolution=0.25, bounds=(-90.0, 90.0, -180.0, 180.0)):
+    """Return the (latitudes, longitudes) of cell centers covering bounds = (south, north, west, east)."""
+    south, north, west, east = bounds
+    lats = np.arange(north - resolution / 2, south, -resolution)  # North up, as in an image
+    lons = np.arange(west + resolution / 2, east, resolution)
+    return lats, lons
+
+
+def geocentric_vectors(names, t, precision="high"):
+    """Return (bodies x 3 x times) apparent geocentric vectors in the true equator of date, and Greenwich sidereal angles.
+
+    These are the only ephemeris evaluations of a map: every grid cell
+    shares them and differs only in the observer's position and horizon.
+    precision="tables" interpolates the tables set in geocentric_tables.
+    """
+    metrics.observed(t, len(names))
+    if precision == "low":
+        return np.array([geocentric_xyz(name, t.tt) for name in names]), np.radians(t.gmst * 15.0)
+
+    t._nutation_angles_radians = iau2000b_radians(t)
+    if precision == "tables":
+        return interpolate_geocentric(get_tables(), t.tt, names), np.radians(t.gast * 15.0)
+
+    eph = get_ephemeris()
+    earth_at = eph["earth"].at(t)
+    xyz = [earth_at.observe(eph[table_bodies[name]]).apparent().frame_xyz(true_equator_and_equinox_of_date).au
+           for name in names]
+    return np.array(xyz), np.radians(t.gast * 15.0)
+
+
+def altitude_map(name, t, output, resolution=0.25, bounds=(-90.0, 90.0, -180.0, 180.0), threshold=10.0,
+                 sun_below=None, tile_rows=64, precision="high"):
+    """Write the altitude raster and visibility mask of a body over a lat/lon grid.
+
+    t is a Skyfield Time, single or array. The results are .npy files
+    opened as memory maps, so the grid never has to fit in memory:
+    output holds float32 altitudes in degrees and output-visible.npy a
+    boolean mask, both (times x latitudes x longitudes) with north up.
+    A cell is visible when the body is above threshold degrees and, with
+    sun_below set, the Sun is below that altitude (-18 for full darkness).
+    The grid is filled tile_rows latitude rows at a time. Returns
+    (latitudes, longitudes, altitude memmap, visible memmap).
+    """
+    t = t if t.shape else t.ts.tt_jd(np.atleast_1d(t.tt))
+    lats, lons = grid_axes(resolution, bounds)
+    names = [name] if sun_below is None or name == "Sun" else [name, "Sun"]
+    with metrics.span("ephemeris"):
+        geocentric, theta = geocentric_vectors(names, t, precision)
+
+    shape = (len(t.tt), len(lats), len(lons))
+    stem = output[:-4] if output.endswith(".npy") else output
+    altitude = np.lib.format.open_memmap(stem + ".npy", mode="w+", dtype=np.float32, shape=shape)
+    visible = np.lib.format.open_memmap(stem + "-visible.npy", mode="w+", dtype=bool, shape=shape)
+
+    with metrics.span("grid"):
+        for start in range(0, len(lats), tile_rows):
+            lat, lon = np.meshgrid(lats[start:start + tile_rows], lons, indexing="ij")
+            lat, lon = lat.ravel(), lon.ravel()
+            rows = slice(start, start + tile_rows)
+            for i in range(shape[0]):
+                # One time against every cell of the tile: cells take the place of times
+                alt = horizon_coordinates(geocentric[:, :, i:i + 1], lat, lon, np.full(lat.shape, theta[i]))[0]
+                alt = alt.reshape(len(names), -1, len(lons))
+                altitude[i, rows] = alt[0]
+                mask = alt[0] > threshold
+                if sun_below is not None:
+                    mask &= alt[-1] < sun_below
+                visible[i, rows] = mask
+            metrics.count("grid_cells", lat.size * shape[0])
+
+    altitude.flush()
+    visible.flush()
+    return lats, lons, altitude, visible
+
+
+def visible_fraction(lats, visible):
+    """Return the fraction of the mapped area where the body is visible, per time (cells weighted by cos latitude)."""
+    weights = np.cos(np.radians(lats))[:, None]
+    return (visible * weights).sum(axis=(1, 2)) / (weights.sum() * visible.shape[2])
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Map where a body is above the horizon over a lat/lon grid.")
+    parser.add_argument("body", choices=list(table_bodies), metavar="body", help=f"One of: {', '.join(table_bodies)}")
+    parser.add_argument("--time", help="UTC time as YYYY-MM-DDTHH:MM (default: now)")
+    parser.add_argument("--hours", type=float, default=0, help="Also map every --step minutes for this many hours")
+    parser.add_argument("--step", type=float, default=60, help="Step in minutes with --hours (default: 60)")
+    parser.add_argument("--resolution", type=float, default=0.25, help="Grid cell size in degrees (default: 0.25)")
+    parser.add_argument("--bounds", type=float, nargs=4, default=[-90, 90, -180, 180], metavar=("S", "N", "W", "E"),
+                        help="Region to map (default: the whole world)")
+    parser.add_argument("--threshold", type=float, default=10, help="Minimum altitude in degrees (default: 10)")
+    parser.add_argument("--sun-below", type=float, metavar="DEG",
+                        help="Only count cells where the Sun is below this altitude, e.g. -18 for darkness")
+    parser.add_argument("--output", help="Altitude raster .npy path (default: <body>-altitude.npy)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Use low-precision analytic positions (arcminute accuracy, no kernel file)")
+    parser.add_argument("--tables", metavar="FILE", help="Interpolate positions from tables written by geocentric_tables.py")
+    metrics.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with metrics.session(args):
+        ts = get_timescale()
+        start = datetime.fromisoformat(args.time).replace(tzinfo=timezone.utc) if args.time else datetime.now(timezone.utc)
+        t = ts.from_datetime(start)
+        if args.hours:
+            t = t + np.arange(0, args.hours * 60 + 1e-9, args.step) / 1440.0
+        output = args.output or f"{args.body.lower()}-altitude.npy"
+        precision = "low" if args.fast else "high"
+        if args.tables:
+            set_tables(args.tables)
+            precision = "tables"
+
+        with metrics.span("compute"):
+            lats, lons, altitude, visible = altitude_map(
+                args.body, t, output, args.resolution, tuple(args.bounds), args.threshold, args.sun_below,
+                precision=precision,
+            )
+
+        with metrics.span("render"):
+            stem = output[:-4] if output.endswith(".npy") else output
+            print(f"🗺️  {args.body}: {altitude.shape[1]} x {altitude.shape[2]} cells, {altitude.shape[0]} time(s)")
+            print(f"   Altitudes: {stem}.npy  Visibility: {stem}-visible.npy")
+            times = t if t.shape else [t]
+            for time_i, fraction in zip(times, visible_fraction(lats, visible)):
+                print(f"   {time_i.utc_strftime('%Y-%m-%d %H:%M')} UTC - visible over {fraction:.1%} of the area")
+
+
+if __name__ == "__main__":
+    main()
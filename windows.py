@@ -0,0 +1,199 @@
+import numpy as np
+from skyfield.nutationlib import iau2000b_radians
+
+from horizon_mask import is_mask, mask_altitude
+import metrics
+
+
+def target_altitude(eph, topos, target):
+    """Return a function giving a target's apparent altitude in degrees at a Time.
+
+    target is anything Skyfield can observe: a kernel body or a Star.
+    Given a horizon_mask table, the function measures the altitude above
+    its skyline instead.
+    """
+    observer = eph['earth'] + topos
+
+    def altitude_at(t, mask=None):
+        # The truncated IAU 2000B nutation is ample here and far cheaper
+        t._nutation_angles_radians = iau2000b_radians(t)
+        metrics.observed(t)
+        alt, az, _ = observer.at(t).observe(target).apparent().altaz()
+        if mask is None:
+            return alt.degrees
+        return alt.degrees - mask_altitude(mask, az.degrees)
+
+    return altitude_at
+
+
+def interpolated_altitudes(eph, topos, targets, ts, tt0, tt1, step_days=1 / 24):
+    """Return a function giving the altitudes of several targets at an array Time, one row per target.
+
+    Apparent directions are computed once on a grid of step_days over
+    [tt0, tt1] and interpolated linearly in between, so each call only
+    rotates them into the observer's horizon. Planets and stars drift far
+    too slowly for this to matter (well under an arcsecond at an hourly
+    step); the Moon does not. Given a horizon_mask table, the function
+    measures altitudes above its skyline instead.
+    """
+    nodes = np.append(np.arange(tt0, tt1, step_days), tt1)
+    t = ts.tt_jd(nodes)
+    t._nutation_angles_radians = iau2000b_radians(t)
+    observer_at = (eph['earth'] + topos).at(t)
+    directions = np.array([observer_at.observe(target).apparent().position.au for target in targets])
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    metrics.observed(t, len(targets))
+
+    def altitude_at(t, mask=None):
+        j = np.clip(np.searchsorted(nodes, t.tt) - 1, 0, len(nodes) - 2)
+        w = (t.tt - nodes[j]) / (nodes[j + 1] - nodes[j])
+        direction = directions[:, :, j] * (1 - w) + directions[:, :, j + 1] * w
+        t._nutation_angles_radians = iau2000b_radians(t)
+        north, east, zenith = topos.rotation_at(t)  # Local axes in GCRS, each (3 x times)
+        sin_alt = np.einsum("kin,in->kn", direction, zenith) / np.linalg.norm(direction, axis=1)
+        alt = np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+        if mask is None:
+            return alt
+        az = np.degrees(np.arctan2(np.einsum("kin,in->kn", direction, east), np.einsum("kin,in->kn", direction, north)))
+        return alt - mask_altitude(mask, az)
+
+    return altitude_at
+
+
+def refine_roots(f, a, b, fa, fb, epsilon=1 / 86400, iterations=10):
+    """Refine brackets [a, b] of roots of f all at once and return the roots.
+
+    f maps an array of TT Julian dates to values whose sign changes inside
+    each bracket; fa and fb are its values at a and b. Uses vectorized
+    false position with the Illinois modification, stopping once every
+    estimate moves by less than epsilon days.
+    """
+    a, b, fa, fb = (np.array(v, dtype=float) for v in (a, b, fa, fb))
+    x = a
+    if not len(a):
+        return x
+    side = np.zeros(len(a))
+    for _ in range(iterations):
+        x_new = (a * fb - b * fa) / (fb - fa)
+        fx = f(x_new)
+        same_side = np.sign(fx) == np.sign(fa)
+        # Illinois: halve the value kept at an end that is retained twice running
+        fb = np.where(same_side & (side == 1), fb / 2, fb)
+        fa = np.where(~same_side & (side == -1), fa / 2, fa)
+        a, fa = np.where(same_side, x_new, a), np.where(same_side, fx, fa)
+        b, fb = np.where(same_side, b, x_new), np.where(same_side, fb, fx)
+        side = np.where(same_side, 1, -1)
+        converged = np.abs(x_new - x).max() <= epsilon
+        x = x_new
+        if converged:
+            break
+    return x
+
+
+def altitude_windows(altitude_at, ts, tt0, tt1, threshold=10.0, step_days=1 / 24, epsilon=1 / 86400):
+    """Solve when a target is above threshold degrees between TT Julian dates tt0 and tt1.
+
+    The altitude is sampled on a coarse grid of step_days, every crossing
+    of the threshold and every local maximum (transit) is bracketed from
+    those samples, and the brackets are refined together. A transit above
+    the threshold between samples below it is a window shorter than the
+    step; its rise and set are bracketed from the transit. Returns a dict:
+
+    - "intervals": (n x 2) array of TT (rise above, set below), clipped to [tt0, tt1]
+    - "peaks" / "peak_altitudes": TT and altitude of each transit above threshold inside the span
+
+    altitude_at may also return a (targets x times) array, in which case
+    every target is solved in the same evaluations and a list with one
+    dict per target is returned.
+
+    threshold may also be a horizon_mask table. altitude_at must then take
+    it as a second argument, as target_altitude and interpolated_altitudes
+    do, and peak_altitudes are heights above the mask's skyline.
+    """
+    if is_mask(threshold):
+        # Solve the height above the skyline against zero
+        above_skyline, mask = altitude_at, threshold
+        altitude_at, threshold = (lambda t: above_skyline(t, mask)), 0.0
+
+    jd = np.append(np.arange(tt0, tt1, step_days), tt1)
+    alt = altitude_at(ts.tt_jd(jd))
+    single = alt.ndim == 1
+    alt = np.atleast_2d(alt)
+
+    def evaluate(x, rows):
+        return np.atleast_2d(altitude_at(ts.tt_jd(x)))[rows, np.arange(len(x))]
+
+    # Bracket threshold crossings, and every transit (local maximum) whatever its sampled altitude
+    up = alt >= threshold
+    rows, idx = np.nonzero(up[:, :-1] != up[:, 1:])
+    peak_rows, peak = np.nonzero((alt[:, 1:-1] > alt[:, :-2]) & (alt[:, 1:-1] >= alt[:, 2:]))
+    peak += 1
+    h = min(step_days / 10, 1 / 1440)
+
+    def climb(x, rows):
+        # Central difference of the altitude, both sides in one evaluation
+        values = evaluate(np.concatenate([x + h, x - h]), np.concatenate([rows, rows]))
+        return values[:len(x)] - values[len(x):]
+
+    def residual(x):
+        # Crossings and transits are refined in the same evaluations
+        crossing, transit = x[:len(rows)], x[len(rows):]
+        values = evaluate(np.concatenate([crossing, transit + h, transit - h]), np.concatenate([rows, peak_rows, peak_rows]))
+        return np.concatenate([values[:len(rows)] - threshold, values[len(rows):len(x)] - values[len(x):]])
+
+    a, b = jd[peak - 1], jd[peak + 1]
+    climb_ab = climb(np.concatenate([a, b]), np.concatenate([peak_rows, peak_rows])) if len(peak) else np.zeros(0)
+    roots = refine_roots(
+        residual,
+        np.concatenate([jd[idx], a]),
+        np.concatenate([jd[idx + 1], b]),
+        np.concatenate([alt[rows, idx] - threshold, climb_ab[:len(a)]]),
+        np.concatenate([alt[rows, idx + 1] - threshold, climb_ab[len(a):]]),
+        epsilon,
+    )
+    crossings, peaks = roots[:len(rows)], roots[len(rows):]
+    peak_altitudes = evaluate(peaks, peak_rows) if len(peak) else np.zeros(0)
+    top = peak_altitudes >= threshold
+
+    # A transit above the threshold whose samples around it are all below is a
+    # window the grid missed: it rises between the sample before and the
+    # transit, and sets between the transit and the sample after
+    missed = np.flatnonzero(top & ~up[peak_rows, peak])
+    missed_rows = np.concatenate([peak_rows[missed], peak_rows[missed]])
+    before, after = peak[missed] - 1, peak[missed] + 1
+    edges = refine_roots(
+        lambda x: evaluate(x, missed_rows) - threshold,
+        np.concatenate([jd[before], peaks[missed]]),
+        np.concatenate([peaks[missed], jd[after]]),
+        np.concatenate([alt[peak_rows[missed], before], peak_altitudes[missed]]) - threshold,
+        np.concatenate([peak_altitudes[missed], alt[peak_rows[missed], after]]) - threshold,
+        epsilon,
+    )
+    short = np.column_stack([edges[:len(missed)], edges[len(missed):]])
+
+    solved = []
+    for row in range(len(alt)):
+        edges = np.concatenate([[tt0] if up[row, 0] else [], crossings[rows == row], [tt1] if up[row, -1] else []])
+        intervals = np.concatenate([edges.reshape(-1, 2), short[peak_rows[missed] == row]])
+        keep = (peak_rows == row) & top
+        solved.append({
+            "intervals": intervals[np.argsort(intervals[:, 0], kind="stable")],
+            "peaks": peaks[keep],
+            "peak_altitudes": peak_altitudes[keep],
+        })
+    return solved[0] if single else solved
+
+
+def intersect_intervals(a, b):
+    """Intersect two sorted lists of disjoint (start, end) intervals."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start, end = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return np.array(result, dtype=float).reshape(-1, 2)